@@ -1,23 +1,41 @@
 import generic
 import utils
 import re
+import copy
+import session
+import cursor_cache
 import tree_matchers as matchers
 
 from clang.cindex import CursorKind, AccessSpecifier
 
+# 提取实体时使用的matcher，只创建一次，编译后的表可以在每次查找中复用
+_IS_ANNOTATION = matchers.is_kind([CursorKind.ANNOTATE_ATTR])
+_IS_ENUM_CONSTANT = matchers.is_kind([CursorKind.ENUM_CONSTANT_DECL])
+_IS_BASE_CLASS = matchers.is_base_class()
+_IS_FIELD = matchers.is_field()
+_IS_METHOD = matchers.is_method()
+
+# 得到当前会话的实体缓存表
+def get_entity_table():
+    current = session.get_current()
+    return current.get_cache(memoize_entity, lambda: session.LruCache(current.max_entities))
+
+# 得到当前会话的实体缓存统计
+# return: Dict[str, int] hits、misses、evictions和size
+def get_entity_stats():
+    return get_entity_table().get_stats()
+
+# 缓存实体，缓存表属于当前线程激活的会话，key为(名字, 原始类型名字, 节点USR, 模板节点USR)
 def memoize_entity(f):
-    memo = {}
     def helper(name, original_name, node, template_node, *args, **kwargs):
-        node_usr = node.get_usr() if node else ''
-        template_node_usr = template_node.get_usr() if template_node else ''
-        key = (name or '') + (original_name or '') + node_usr + template_node_usr
-        if key not in memo:
+        memo = get_entity_table()
+        key = (name, original_name, cursor_cache.usr(node) if node else None,
+               cursor_cache.usr(template_node) if template_node else None)
+        result = memo.get(key)
+        if result is None:
             result = f(name, original_name, node, template_node, *args, **kwargs)
-            if not isinstance(result, generic.RecursiveType):
-                memo[key] = result
-            else:
-                return result
-        return memo[key]
+            memo.put(key, result)
+        return result
     return helper
 
 # 转换location
@@ -44,7 +62,7 @@ def _typedef_present(complete_name, original_token):
 
 # 得到访问属性
 def _get_access_specifier(node):
-    acc_spec = node.access_specifier
+    acc_spec = cursor_cache.access_specifier(node)
     if acc_spec == AccessSpecifier.PUBLIC:
         return generic.AccessSpecifier.PUBLIC
     elif acc_spec == AccessSpecifier.PROTECTED:
@@ -56,13 +74,15 @@ def _get_access_specifier(node):
 
 # 创造实体信息
 @memoize_entity
-def _create_entity_info(basic_name, original_typename, def_node, template_class,tu, scf_path, prev):
+def _create_entity_info(basic_name, original_typename, def_node, template_class,tu, scf_path, pending):
     if template_class:
-        type_info = get_abstract_entity(template_class, tu, scf_path, prev)
+        type_info = get_abstract_entity(template_class, tu, scf_path, pending)
     else:
-        type_info = get_abstract_entity(def_node, tu, scf_path, prev) \
+        type_info = get_abstract_entity(def_node, tu, scf_path, pending) \
             if def_node else generic.PrimitiveType(basic_name)
+    # 类型图中的实体被所有引用共用，typedef名字只属于这一处引用，放在浅拷贝上
     if _typedef_present(type_info.complete_name(), original_typename):
+        type_info = copy.copy(type_info)
         type_info.original_typedef = original_typename
     return type_info
 
@@ -70,43 +90,46 @@ def _create_entity_info(basic_name, original_typename, def_node, template_class,
 def _get_init_value(field_node, tu):
     initializer = matchers.get_initializer_expr(field_node)
     if initializer:
-        token = list(tu.get_tokens(None, initializer.extent))[0]
+        token = next(tu.get_tokens(None, initializer.extent))
         return token.spelling
     else:
         return None
 
 # 得到field信息
-def _get_field_info(field_node, tu, scf_path, prev):
-    field_type, def_node, template_class = utils.get_type_info(field_node.type, tu, scf_path)
-    type_info = _create_entity_info(field_type.name, field_node.type.spelling, def_node, template_class,
-                                    tu, scf_path, prev)
-    return generic.Field(name=field_node.spelling, access_specifier=_get_access_specifier(field_node),
+def _get_field_info(field_node, tu, scf_path, pending):
+    node_type = cursor_cache.get_type(field_node)
+    field_type = utils.get_type_info(node_type, tu, scf_path)
+    type_info = _create_entity_info(field_type.name, node_type.spelling, field_type.definition, field_type.container,
+                                    tu, scf_path, pending)
+    return generic.Field(name=cursor_cache.spelling(field_node), access_specifier=_get_access_specifier(field_node),
                          type_info=type_info,
-                         traits=generic.TypeTraits(
-                                     field_type.traits.is_const, field_type.traits.ref_type),
-                         init_value=_get_init_value(field_node, tu), location=_convert_location(field_node.location))
+                         traits=generic.TypeTraits(field_type.is_const, field_type.ref_type),
+                         init_value=_get_init_value(field_node, tu),
+                         location=_convert_location(cursor_cache.location(field_node)))
 
 # 得到参数
-def _get_param(param_node, tu, scf_path, prev):
-    param_type, def_node, template_class = utils.get_type_info(param_node.type, tu, scf_path)
-    type_info = _create_entity_info(param_type.name, param_node.type.spelling, def_node, template_class,
-                                    tu, scf_path, prev)
-    return generic.Param(name=param_node.spelling, type_info=type_info,
-                         traits=generic.TypeTraits(param_type.traits.is_const, param_type.traits.ref_type),
-                         location=_convert_location(param_node.location))
+def _get_param(param_node, tu, scf_path, pending):
+    node_type = cursor_cache.get_type(param_node)
+    param_type = utils.get_type_info(node_type, tu, scf_path)
+    type_info = _create_entity_info(param_type.name, node_type.spelling, param_type.definition, param_type.container,
+                                    tu, scf_path, pending)
+    return generic.Param(name=cursor_cache.spelling(param_node), type_info=type_info,
+                         traits=generic.TypeTraits(param_type.is_const, param_type.ref_type),
+                         location=_convert_location(cursor_cache.location(param_node)))
 
 # 得到注释
 def _get_annotation(node):
-    annotations = matchers.get_children(node, lambda n: n.kind == CursorKind.ANNOTATE_ATTR)
-    return annotations[0].spelling if annotations else None
+    annotation = matchers.find_children(node, _IS_ANNOTATION).first()
+    return cursor_cache.spelling(annotation) if annotation else None
 
 # 获取method信息
-def _get_api(api_node, tu, scf_path, prev):
-    params = [_get_param(param_node, tu, scf_path, prev) for param_node in matchers.get_params(api_node)]
-    return_type, ret_def_node, template_class = utils.get_type_info(api_node.result_type, tu, scf_path)
+def _get_api(api_node, tu, scf_path, pending):
+    params = [_get_param(param_node, tu, scf_path, pending) for param_node in matchers.find_params(api_node)]
+    result_type = api_node.result_type
+    return_type = utils.get_type_info(result_type, tu, scf_path)
 
-    return_type_info = _create_entity_info(return_type.name, api_node.result_type.spelling, ret_def_node,
-                                           template_class, tu, scf_path, prev)
+    return_type_info = _create_entity_info(return_type.name, result_type.spelling, return_type.definition,
+                                           return_type.container, tu, scf_path, pending)
 
     traits = generic.ApiTraits(
         is_const=api_node.is_const_method(),
@@ -115,78 +138,133 @@ def _get_api(api_node, tu, scf_path, prev):
         is_static=api_node.is_static_method(),
         annotation=_get_annotation(api_node))
 
-    return generic.Api(name=api_node.spelling, access_specifier=_get_access_specifier(api_node),
+    return generic.Api(name=cursor_cache.spelling(api_node), access_specifier=_get_access_specifier(api_node),
                        param_types=params, traits=traits,
                        returns=generic.ApiReturns(return_type_info, generic.TypeTraits(
-                           return_type.traits.is_const, return_type.traits.ref_type)),
-                       location=_convert_location(api_node.location))
+                           return_type.is_const, return_type.ref_type)),
+                       location=_convert_location(cursor_cache.location(api_node)))
 
 # 从节点提取实体
 def from_node(node, tu, scf_path):
-    return get_abstract_entity(node, tu, scf_path, [])
+    return get_abstract_entity(node, tu, scf_path, {})
+
+# 得到语法树的类型图，声明的key -> 实体，引用同一个声明的地方共用一个实体
+# 类型图属于语法树，随语法树释放，重新解析之后重新提取，USR相同的声明在新的语法树中可能已经改变
+def get_type_graph(tu):
+    return cursor_cache.get_cache(tu).get_table('type_graph')
+
+# 得到声明在类型图中的key，没有USR的节点不放入类型图
+def _get_graph_key(node):
+    usr = cursor_cache.usr(node)
+    return (usr, node.is_definition()) if usr else None
 
 # 从节点提取抽象实体
-def get_abstract_entity(node, tu, scf_path, prev):
-    ns = utils.get_namespace(node)
-    full_name = ns + '::' + node.spelling if ns else node.spelling
-    if any(full_name == p for p in prev):
-        return generic.RecursiveType(node.spelling, ns)
+# pending:  Dict  当前正在提取的声明的key -> 还没有填完成员的实体，再次遇到时直接引用，循环引用成为图中的环
+def get_abstract_entity(node, tu, scf_path, pending):
+    key = _get_graph_key(node)
+    graph = get_type_graph(tu)
+    entity = pending.get(key) or graph.get(key) if key else None
+    if entity is not None:
+        return entity
     if node.kind == CursorKind.ENUM_DECL:
-        return get_abstract_enum(node, tu, scf_path)
+        entity = get_abstract_enum(node, tu, scf_path)
     else:
-        return get_abstract_class(node, tu, scf_path, prev)
+        entity = get_abstract_class(node, tu, scf_path, pending, key)
+    if key:
+        graph[key] = entity
+    return entity
 
 # 从节点提取enum
 def get_abstract_enum(node, tu, scf_path):
-    enum_constant_nodes = matchers.get_children(node, lambda n: n.kind == CursorKind.ENUM_CONSTANT_DECL)
+    enum_constant_nodes = matchers.find_children(node, _IS_ENUM_CONSTANT)
     full_namespace = utils.get_namespace(node)
-    constants = [generic.EnumConstant(cons.spelling, cons.enum_value) for cons in enum_constant_nodes]
-    return generic.DefinedEnum(name=node.spelling, namespace=full_namespace, constants=constants, \
+    constants = [generic.EnumConstant(cursor_cache.spelling(cons), cons.enum_value)
+                 for cons in enum_constant_nodes]
+    return generic.DefinedEnum(name=cursor_cache.spelling(node), namespace=full_namespace, constants=constants, \
                                defined_in_header=utils.get_header(node, tu, scf_path), \
-                               location=_convert_location(node.location))
+                               location=_convert_location(cursor_cache.location(node)))
 
-# 从节点提取class
-def get_abstract_class(node, tu, scf_path, prev):
-    ns = utils.get_namespace(node)
-    full_name = ns + '::' + node.spelling if ns else node.spelling
+# 提取类的基类
+def _get_bases(node, tu, scf_path, pending):
+    base_nodes = list(matchers.find_children(node, _IS_BASE_CLASS))
+    base_type_infos = [utils.get_type_info(cursor_cache.get_type(base_node), tu, scf_path)
+                       for base_node in base_nodes]
+    return [_create_entity_info(base_type.name, cursor_cache.get_type(base_node).spelling, \
+            base_type.definition, base_type.container, tu, scf_path, pending) \
+            for (base_node, base_type) in zip(base_nodes, base_type_infos)]
 
-    base_nodes = matchers.get_children(node, matchers.is_base_class())
-    base_type_infos = [utils.get_type_info(base_node.type, tu, scf_path) for base_node in base_nodes]
-    base_classes = [_create_entity_info(base_type.name, base_node.type.spelling, \
-                    def_node, template_class, tu, scf_path, prev + [full_name]) \
-                    for (base_node, (base_type, def_node, template_class)) in zip(base_nodes, base_type_infos)]
+# 提取类的field
+def _get_fields(node, tu, scf_path, pending):
+    return [_get_field_info(field_node, tu, scf_path, pending) for field_node in matchers.find_children(node, _IS_FIELD)]
 
-    field_nodes = matchers.get_children(node, matchers.is_field())
-    fields = [_get_field_info(field_node, tu, scf_path, prev + [full_name]) for field_node in field_nodes]
+# 提取类的method
+def _get_apis(node, tu, scf_path, pending):
+    return [_get_api(api_node, tu, scf_path, pending) for api_node in matchers.find_children(node, _IS_METHOD)]
 
-    api_nodes = matchers.get_children(node, matchers.is_method())
-    apis = [_get_api(api_node, tu, scf_path, prev + [full_name]) for api_node in api_nodes]
+# 延迟提取类的属性，第一次访问时在创建实体的会话中提取，引用的类型已经在类型图中，不需要pending
+def _defer(current, get_attribute, node, tu, scf_path):
+    def load():
+        with current.activate():
+            return get_attribute(node, tu, scf_path, {})
+    return generic.Deferred(load)
 
-    annotation = _get_annotation(node)
+# 求出实体和它直接、间接引用的所有实体中延迟提取的属性，之后实体不再引用语法树，可以在语法树重新解析或者释放之后使用
+def resolve_entities(entities):
+    pending = list(entities)
+    seen = set()
+    while pending:
+        entity = pending.pop()
+        if id(entity) in seen or not isinstance(entity, generic.DeclaredClass):
+            continue
+        seen.add(id(entity))
+        pending.extend(entity.template_args)
+        if isinstance(entity, generic.DefinedClass):
+            pending.extend(entity.bases)
+            pending.extend(field.type_info for field in entity.members)
+            for api in entity.methods:
+                pending.append(api.returns.type_info)
+                pending.extend(param.type_info for param in api.param_types)
 
-    template_args = [node.type.get_template_argument_type(i) for i in range(node.type.get_num_template_arguments())]
-    if template_args:
-        template_args_entities = [
-            generic.PrimitiveType(
-                utils.get_primitive_type(templ_arg)) if utils.is_primitive(templ_arg)
-            else get_abstract_entity(templ_arg.get_declaration(), tu, scf_path, prev + [full_name])
-            for templ_arg in template_args]
+# 判断类是否不透明，不透明的类只提取名字和模板参数，不进入它的成员
+# 定义在工程外的类，如STL和框架中的类，除非在当前会话的transparent_types中
+def _is_opaque(name, ns, header, scf_path):
+    return bool(scf_path) and not header and generic.cat_ns(ns, name) not in session.get_current().transparent_types
 
+# 从节点提取class，先判断是否不透明，再创建成员为空的实体放入pending，然后提取模板参数和成员，成员中引用自己时得到的是同一个实体
+# 成员列表原地填充，提取过程中得到的浅拷贝也能看到最终的成员；会话使用lazy_entities时成员在第一次访问时才提取
+# key: 节点在类型图中的key，为空则不放入pending
+def get_abstract_class(node, tu, scf_path, pending, key=None):
+    node_type = cursor_cache.get_type(node)
+    template_args = [node_type.get_template_argument_type(i) for i in range(node_type.get_num_template_arguments())]
+    if template_args:
+        name, ns = cursor_cache.spelling(node), utils.get_namespace(node)
         header = utils.get_header(node, tu, scf_path)
-        if header or not scf_path:
-            return generic.DefinedClass(name=node.spelling, namespace=utils.get_namespace(node),
-                                        template_args=template_args_entities, members=fields, methods=apis,
-                                        bases=base_classes, defined_in_header=header,
-                                        location=_convert_location(node.location), annotation=annotation)
-        else:
-            return generic.DeclaredClass(node.spelling, utils.get_namespace(node), template_args_entities, None)
     else:
-        type_info, _, _ = utils.get_type_info(node.type, tu, scf_path)
-        if type_info.header_with_def or not scf_path:
-            return generic.DefinedClass(name=type_info.name, namespace=type_info.namespace, template_args=[],
-                                        members=fields, methods=apis, bases=base_classes,
-                                        defined_in_header=type_info.header_with_def,
-                                        location=_convert_location(node.location), annotation=annotation)
-        else:
-            return generic.DeclaredClass(type_info.name, type_info.namespace, [], None)
+        type_info = utils.get_type_info(node_type, tu, scf_path)
+        name, ns, header = type_info.name, type_info.namespace, type_info.header_with_def
+
+    if not _is_opaque(name, ns, header, scf_path):
+        entity = generic.DefinedClass(name=name, namespace=ns, template_args=[], members=[], methods=[], bases=[],
+                                      defined_in_header=header, location=_convert_location(cursor_cache.location(node)),
+                                      annotation=_get_annotation(node))
+    else:
+        entity = generic.DeclaredClass(name, ns, [], None)
+    if key:
+        pending[key] = entity
+
+    entity.template_args.extend(
+        generic.PrimitiveType(utils.get_primitive_type(templ_arg)) if utils.is_primitive(templ_arg)
+        else get_abstract_entity(templ_arg.get_declaration(), tu, scf_path, pending)
+        for templ_arg in template_args)
+
+    if isinstance(entity, generic.DefinedClass):
+        current = session.get_current()
+        for attribute, get_attribute in (('bases', _get_bases), ('members', _get_fields), ('methods', _get_apis)):
+            if current.lazy_entities:
+                setattr(entity, attribute, _defer(current, get_attribute, node, tu, scf_path))
+            else:
+                getattr(entity, attribute).extend(get_attribute(node, tu, scf_path, pending))
 
+    if key:
+        del pending[key]
+    return entity
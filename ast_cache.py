@@ -0,0 +1,100 @@
+import os
+import json
+import threading
+import hashlib
+import logging
+
+from clang.cindex import conf, _CXString, TranslationUnit, TranslationUnitLoadError, TranslationUnitSaveError
+
+# 得到libclang的版本字符串，不同版本保存的AST不能互相加载
+def get_clang_version():
+    version_fn = conf.lib.clang_getClangVersion
+    version_fn.argtypes = []
+    version_fn.restype = _CXString
+    version_fn.errcheck = _CXString.from_result
+    version = version_fn()
+    return version.decode() if isinstance(version, bytes) else version
+
+# 计算文件内容的hash，文件不存在则返回None
+def hash_file(path):
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+# 得到缓存的key，由输入头文件、编译参数和libclang版本共同决定
+# input_headers:  List[str]    需要解析的头文件
+# args:           List[str]    utils.get_args得到的编译参数
+# extra:          List[str]    其他会影响解析结果的参数
+def get_cache_key(input_headers, args, extra=()):
+    key_info = json.dumps({
+        'headers': list(input_headers),
+        'args': list(args),
+        'extra': [str(x) for x in extra],
+        'clang': get_clang_version()
+    }, sort_keys=True)
+    return hashlib.sha256(key_info.encode()).hexdigest()
+
+# 得到语法树中所有被包含的文件
+def get_dependencies(tu, input_headers):
+    dependencies = set(input_headers)
+    for inclusion in tu.get_includes():
+        dependencies.add(inclusion.include.name)
+    return sorted(dependencies)
+
+# 得到缓存文件路径，分别是AST文件和记录依赖文件hash的manifest文件
+def get_cache_paths(cache_dir, key, suffix='.ast'):
+    return os.path.join(cache_dir, key + suffix), os.path.join(cache_dir, key + '.json')
+
+# 判断缓存文件是否存在，且manifest中记录的依赖文件都没有修改
+def is_up_to_date(cache_dir, key, suffix='.ast'):
+    ast_path, manifest_path = get_cache_paths(cache_dir, key, suffix)
+    if not os.path.exists(ast_path) or not os.path.exists(manifest_path):
+        return False
+
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        logging.warning('Ignoring corrupted cache manifest %s', manifest_path)
+        return False
+
+    return all(hash_file(path) == digest for path, digest in manifest.items())
+
+# 尝试从缓存中加载语法树，所有依赖文件都没有修改才会命中
+# return: clang.cindex.TranslationUnit，没有命中返回None
+def load(cache_dir, key, index=None):
+    ast_path, _ = get_cache_paths(cache_dir, key)
+    if not is_up_to_date(cache_dir, key):
+        logging.info('AST cache %s is missing or out of date', key)
+        return None
+
+    try:
+        tu = TranslationUnit.from_ast_file(ast_path, index)
+    except TranslationUnitLoadError:
+        logging.warning('Failed to load cached AST %s', ast_path)
+        return None
+    logging.info('Loaded AST from cache %s', ast_path)
+    return tu
+
+# 将语法树和依赖文件的hash写入缓存
+# return: bool 是否保存成功
+def store(cache_dir, key, tu, input_headers, suffix='.ast'):
+    ast_path, manifest_path = get_cache_paths(cache_dir, key, suffix)
+    os.makedirs(cache_dir, exist_ok=True)
+    manifest = {path: hash_file(path) for path in get_dependencies(tu, input_headers)}
+
+    # 先写临时文件再替换，避免其他进程或线程读到写了一半的缓存
+    tmp_suffix = '.{}.{}.tmp'.format(os.getpid(), threading.get_ident())
+    try:
+        tu.save(ast_path + tmp_suffix)
+    except TranslationUnitSaveError:
+        logging.warning('Failed to save AST to cache %s', ast_path)
+        return False
+    os.replace(ast_path + tmp_suffix, ast_path)
+
+    with open(manifest_path + tmp_suffix, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(manifest_path + tmp_suffix, manifest_path)
+    return True
@@ -0,0 +1,62 @@
+import os
+import sys
+import time
+import argparse
+import statistics
+
+# 仓库根目录
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import main
+import parsers
+import session
+import discovery
+import tree_matchers
+
+# 修改之前的做法：分别先序遍历整个语法树找class和enum，包括标准库等工程外的子树
+def _separate_walks(tu, input_headers):
+    input_headers = set(input_headers)
+    return (tree_matchers.get_classes(tu.cursor, parsers._is_local_definition(input_headers))
+            + tree_matchers.get_enums(tu.cursor, parsers._is_local_definition(input_headers)))
+
+# 多次调用函数，返回每次的时间和最后一次的结果
+def _measure(function, tu, input_headers, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        nodes = function(tu, input_headers)
+        times.append(time.perf_counter() - start)
+    return times, nodes
+
+# 比较分别遍历整个语法树和跳过工程外子树的一次遍历找实体节点的时间，并检查两者找到的节点和顺序相同
+def run():
+    parser = argparse.ArgumentParser(description='Compare entity node collection with separate and pruned walks.')
+    parser.add_argument('--header-root', default=os.path.join(ROOT, 'src'), help='headers to parse')
+    parser.add_argument('--libclang-path', default=main.DEFAULT_CONFIG['libclang_path'])
+    parser.add_argument('--stl-headers', default=main.DEFAULT_CONFIG['stl_headers'])
+    parser.add_argument('--c-headers', default=main.DEFAULT_CONFIG['c_headers'])
+    parser.add_argument('--sysroot', default='full', choices=['full', 'shim'], help='system headers to parse with')
+    parser.add_argument('--runs', type=int, default=5, help='number of measured runs of each walk')
+    args = parser.parse_args()
+
+    headers = discovery.find_headers([args.header_root])
+    with session.Session(args.libclang_path).activate():
+        tu, _ = parsers.parse_tu(headers, args.libclang_path, args.stl_headers, args.c_headers, [],
+                                 discovery.get_header_dirs(headers), sysroot=args.sysroot)
+        times = {}
+        nodes = {}
+        for name, function in [('separate walks', _separate_walks), ('pruned walk', parsers._get_entity_nodes)]:
+            times[name], nodes[name] = _measure(function, tu, headers, args.runs)
+
+    print('%d header(s), %d entity node(s), sysroot: %s' % (len(headers), len(nodes['pruned walk']), args.sysroot))
+    for name, values in times.items():
+        print('%-15s median %.4fs, min %.4fs over %d runs' % (name, statistics.median(values), min(values), len(values)))
+    print('speedup: %.2fx' % (statistics.median(times['separate walks']) / statistics.median(times['pruned walk'])))
+    if nodes['separate walks'] != nodes['pruned walk']:
+        print('WARNING: entity nodes differ between the separate walks and the pruned walk')
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(run())
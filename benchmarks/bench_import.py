@@ -0,0 +1,61 @@
+import os
+import re
+import sys
+import json
+import argparse
+import tempfile
+import statistics
+import subprocess
+import time
+
+# 仓库根目录
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 匹配 -X importtime 的输出: import time: self [us] | cumulative | imported package
+_IMPORT_TIME_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$')
+
+# 运行一次main，返回运行时间和 -X importtime 的输出
+def _run(config_path):
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, '-X', 'importtime', os.path.join(ROOT, 'main.py'), '--config',
+                              config_path], cwd=ROOT, capture_output=True, text=True, check=True)
+    return time.perf_counter() - start, process.stderr
+
+# 得到顶层导入的模块和累计导入时间，按时间从大到小排列
+def _get_top_imports(importtime_output):
+    imports = []
+    for line in importtime_output.splitlines():
+        match = _IMPORT_TIME_RE.match(line)
+        if match and len(match.group(3)) == 1:
+            imports.append((int(match.group(2)), match.group(4)))
+    return sorted(imports, reverse=True)
+
+# 测量输出都是最新时main的启动时间和导入开销
+def main():
+    parser = argparse.ArgumentParser(description='Measure the start-up time of an up-to-date run of main.py.')
+    parser.add_argument('--header-root', default=os.path.join(ROOT, 'src'), help='headers to generate from')
+    parser.add_argument('--runs', type=int, default=10, help='number of measured runs')
+    parser.add_argument('--top', type=int, default=10, help='number of top-level imports to report')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        config_path = os.path.join(directory, 'config.json')
+        with open(config_path, 'w') as f:
+            json.dump({'header_roots': [os.path.abspath(args.header_root)],
+                       'output_dir': os.path.join(directory, 'out'),
+                       'manifest_path': os.path.join(directory, 'manifest.json')}, f)
+
+        cold_time, _ = _run(config_path)
+        times = []
+        for _ in range(args.runs):
+            elapsed, importtime_output = _run(config_path)
+            times.append(elapsed)
+
+    print('first run (generates output): %.3fs' % cold_time)
+    print('up-to-date run: median %.3fs, min %.3fs over %d runs' % (statistics.median(times), min(times), len(times)))
+    print('top-level imports of the last up-to-date run (cumulative):')
+    for microseconds, module in _get_top_imports(importtime_output)[:args.top]:
+        print('  %8.1fms  %s' % (microseconds / 1000, module))
+
+if __name__ == '__main__':
+    main()
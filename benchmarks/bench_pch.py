@@ -0,0 +1,69 @@
+import os
+import sys
+import time
+import argparse
+import statistics
+
+# 仓库根目录
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pch
+import main
+import utils
+import parsers
+import printers
+import session
+import discovery
+
+# 解析一次头文件，不使用语法树缓存，返回解析时间和生成的结果
+def _parse(headers, parse_args, pch_prelude):
+    with session.Session(parse_args[0]).activate():
+        start = time.perf_counter()
+        parsers.parse_tu(headers, *parse_args, pch_prelude=pch_prelude)
+        elapsed = time.perf_counter() - start
+        return elapsed, printers.format_entities(printers.JSONPrinter(), *parsers.parse(headers, *parse_args,
+                                                                                          pch_prelude=pch_prelude))
+
+# 比较使用和不使用预编译头时解析所有头文件的时间，并检查两者生成的结果相同
+def run():
+    parser = argparse.ArgumentParser(description='Compare parse times with and without a precompiled header.')
+    parser.add_argument('--header-root', default=os.path.join(ROOT, 'src'), help='headers to parse')
+    parser.add_argument('--prelude', nargs='+', default=['vector', 'string', 'map', 'memory', 'functional'],
+                        help='headers put into the precompiled header')
+    parser.add_argument('--libclang-path', default=main.DEFAULT_CONFIG['libclang_path'])
+    parser.add_argument('--stl-headers', default=main.DEFAULT_CONFIG['stl_headers'])
+    parser.add_argument('--c-headers', default=main.DEFAULT_CONFIG['c_headers'])
+    parser.add_argument('--runs', type=int, default=5, help='number of measured runs of each mode')
+    args = parser.parse_args()
+
+    headers = discovery.find_headers([args.header_root])
+    parse_args = (args.libclang_path, args.stl_headers, args.c_headers, [], discovery.get_header_dirs(headers))
+
+    # 第一次使用预编译头时需要生成它，单独计时
+    build_time, _ = _parse(headers, parse_args, args.prelude)
+    if not pch.get_pch(args.prelude, utils.get_args(args.stl_headers, args.c_headers, parsers.get_scf_path(),
+                                                    *parse_args[3:])):
+        print('Failed to build the precompiled header, check --stl-headers and --c-headers')
+        return 1
+
+    outputs = {}
+    times = {}
+    for name, prelude in [('without PCH', None), ('with PCH', args.prelude)]:
+        times[name] = []
+        for _ in range(args.runs):
+            elapsed, outputs[name] = _parse(headers, parse_args, prelude)
+            times[name].append(elapsed)
+
+    print('%d header(s), prelude: %s' % (len(headers), ' '.join(args.prelude)))
+    print('first run with PCH (builds it): %.3fs' % build_time)
+    for name, values in times.items():
+        print('%-12s median %.3fs, min %.3fs over %d runs' % (name, statistics.median(values), min(values), len(values)))
+    print('speedup: %.2fx' % (statistics.median(times['without PCH']) / statistics.median(times['with PCH'])))
+    if outputs['without PCH'] != outputs['with PCH']:
+        print('WARNING: generated entities differ with and without PCH')
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(run())
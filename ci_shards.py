@@ -0,0 +1,164 @@
+import os
+import json
+import time
+import enum
+import logging
+
+import generic
+import parsers
+import sharding
+import generic_composer
+
+# 计划文件和shard结果文件的格式版本，格式变化时需要重新生成
+PLAN_VERSION = 2
+
+# shard结果中可以出现的实体类和枚举，读取时只创建这些类的对象，不执行文件中的任何代码
+ENTITY_CLASSES = {cls.__name__: cls for cls in [
+    generic.PrimitiveType, generic.RecursiveType, generic.EnumConstant, generic.Location, generic.DefinedEnum,
+    generic.ApiTraits, generic.Api, generic.Field, generic.Param, generic.ApiReturns, generic.TypeTraits,
+    generic.DeclaredClass, generic.DefinedClass, generic.RefType, generic.AccessSpecifier,
+    generic_composer.MetaClass]}
+
+# 读取历史开销，格式与include_cost.analyze的报告相同，使用每个头文件单独解析的时间
+# return: Dict[str, float] 头文件 -> 秒
+def load_costs(cost_path):
+    with open(cost_path) as f:
+        report = json.load(f)
+    return {row['header']: row['parse_time'] for row in report['headers'] if 'parse_time' in row}
+
+# 估计每个头文件的开销，没有历史开销的头文件按文件大小和有历史开销的头文件的平均速度估计
+def _estimate_costs(headers, costs):
+    sizes = {header: max(os.path.getsize(header), 1) for header in headers}
+    known = [header for header in headers if header in costs]
+    seconds_per_byte = sum(costs[header] for header in known) / sum(sizes[header] for header in known) \
+        if known else 1.0
+    return {header: costs[header] if header in costs else sizes[header] * seconds_per_byte for header in headers}
+
+# 按开销将头文件分成开销尽量平均的shard，开销大的头文件先分配到当前开销最小的shard
+# return: List[List[str]] 每个shard中的头文件，保持头文件原来的顺序
+def split_balanced(headers, shard_count, costs=None):
+    shard_count = max(1, min(shard_count, len(headers)))
+    estimated = _estimate_costs(headers, costs or {})
+    loads = [0.0] * shard_count
+    assignment = {}
+    for header in sorted(headers, key=lambda x: estimated[x], reverse=True):
+        shard = loads.index(min(loads))
+        loads[shard] += estimated[header]
+        assignment[header] = shard
+    logging.info('Planned %d shard(s), estimated cost %s', shard_count, ', '.join('%.3f' % x for x in loads))
+    return [[header for header in headers if assignment[header] == i] for i in range(shard_count)]
+
+# 生成计划文件，记录所有头文件、每个shard的头文件和头文件路径，各个CI机器使用同一个计划文件
+def plan(plan_path, headers, header_paths, shard_count, costs=None):
+    shards = split_balanced(headers, shard_count, costs)
+    _write_file(plan_path, json.dumps({'version': PLAN_VERSION, 'headers': headers, 'header_paths': header_paths,
+                                       'shards': shards}, indent=1).encode())
+    return shards
+
+# 读取计划文件
+def load_plan(plan_path):
+    with open(plan_path) as f:
+        shard_plan = json.load(f)
+    if shard_plan.get('version') != PLAN_VERSION:
+        raise ValueError('Unsupported shard plan version in ' + plan_path)
+    return shard_plan
+
+# 先写临时文件再替换，其他机器不会读到写了一半的文件
+def _write_file(path, content):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+# 得到shard结果文件的路径
+def get_shard_path(shard_dir, shard_index):
+    return os.path.join(shard_dir, 'shard-{}.json'.format(shard_index))
+
+# 将实体转换成可以写入JSON的值，实体对象保存在objects中，引用同一个对象的地方保存它的序号
+# objects:  List[dict]      已转换的对象，每个对象为{'class': 类名, 'fields': 属性}
+# ids:      Dict[int, int]  对象id -> 在objects中的序号，实体之间可能互相引用
+def _encode(value, objects, ids):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, list):
+        return [_encode(item, objects, ids) for item in value]
+    if isinstance(value, tuple):
+        return {'tuple': [_encode(item, objects, ids) for item in value]}
+    if ENTITY_CLASSES.get(type(value).__name__) is not type(value):
+        raise TypeError('Cannot write {} to a shard result'.format(type(value).__name__))
+    if isinstance(value, enum.Enum):
+        return {'enum': type(value).__name__, 'name': value.name}
+    if id(value) not in ids:
+        ids[id(value)] = len(objects)
+        objects.append(None)
+        # DefinedClass的__getstate__会先对延迟提取的属性求值
+        state = (value.__getstate__() if hasattr(value, '__getstate__') else None) or vars(value)
+        objects[ids[id(value)]] = {'class': type(value).__name__,
+                                   'fields': {name: _encode(field, objects, ids) for name, field in state.items()}}
+    return {'ref': ids[id(value)]}
+
+# 将_encode的结果转换回实体，instances是objects中每个对象对应的实例
+def _decode(value, instances):
+    if isinstance(value, list):
+        return [_decode(item, instances) for item in value]
+    if not isinstance(value, dict):
+        return value
+    if 'tuple' in value:
+        return tuple(_decode(item, instances) for item in value['tuple'])
+    if 'enum' in value:
+        return ENTITY_CLASSES[value['enum']][value['name']]
+    return instances[value['ref']]
+
+# 读取shard结果中的实体，先创建所有对象再填充属性，互相引用的实体也能还原
+# return: List[(usr, 实体, MetaClass)]
+def _decode_results(objects, results):
+    instances = [ENTITY_CLASSES[item['class']].__new__(ENTITY_CLASSES[item['class']]) for item in objects]
+    for instance, item in zip(instances, objects):
+        instance.__dict__.update({name: _decode(field, instances) for name, field in item['fields'].items()})
+    return [tuple(_decode(item, instances)) for item in results]
+
+# 解析计划中的一个shard，将带USR的实体写到shard_dir中
+# 其他参数与parsers.parse_tu相同，头文件路径使用计划文件中的
+def run_shard(plan_path, shard_index, shard_dir, libclang_path, stl_headers, c_headers, target_macros,
+              cache_dir=None, pch_prelude=None, profile='full', sysroot='full'):
+    shard_plan = load_plan(plan_path)
+    shard = shard_plan['shards'][shard_index]
+    start = time.time()
+    results = []
+    if shard:
+        results = sharding.parse_shard(shard, libclang_path, stl_headers, c_headers, target_macros,
+                                       shard_plan['header_paths'], cache_dir, pch_prelude, profile, sysroot)
+    parse_time = time.time() - start
+    objects = []
+    encoded = _encode([list(item) for item in results], objects, {})
+    _write_file(get_shard_path(shard_dir, shard_index),
+                json.dumps({'version': PLAN_VERSION, 'headers': shard, 'parse_time': parse_time,
+                            'objects': objects, 'results': encoded}).encode())
+    logging.info('Shard %d: parsed %d header(s) in %.3fs', shard_index, len(shard), parse_time)
+    return results
+
+# 合并所有shard的结果，按USR去重，得到与单独一次parsers.parse相同的结果
+# return: models, enums, viewmodels, services
+def merge_shards(plan_path, shard_dir):
+    shard_plan = load_plan(plan_path)
+    shard_results = []
+    for shard_index, shard in enumerate(shard_plan['shards']):
+        shard_path = get_shard_path(shard_dir, shard_index)
+        if not os.path.exists(shard_path):
+            raise ValueError('Missing result of shard {}: {}'.format(shard_index, shard_path))
+        with open(shard_path) as f:
+            partial = json.load(f)
+        if partial.get('version') != PLAN_VERSION or partial.get('headers') != shard:
+            raise ValueError('Result of shard {} does not match the plan: {}'.format(shard_index, shard_path))
+        try:
+            shard_results.append(_decode_results(partial['objects'], partial['results']))
+        except (KeyError, IndexError, TypeError, AttributeError) as e:
+            raise ValueError('Invalid result of shard {}: {} ({!r})'.format(shard_index, shard_path, e))
+
+    # 先按计划中头文件的顺序排列再去重，与所有头文件一起解析时一样，重复定义的实体保留最先包含的头文件中的
+    order = {header: i for i, header in enumerate(shard_plan['headers'])}
+    results = sorted((item for results in shard_results for item in results),
+                     key=lambda item: order[item[1].location.filename])
+    merged = sharding.merge_shard_results([results])
+    return parsers.convert_entities(parsers.order_entities(merged, shard_plan['headers']))
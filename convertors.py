@@ -32,6 +32,11 @@ class AbstractGenericTypesVisitor:
         pass
 
 class CHTypeConvertor(AbstractGenericTypesVisitor):
+    # 类型图中同一个声明的实体是共用的，记录正在转换模板参数的类的完整名字，
+    # 模板参数与外层同名时按递归类型转换，如std::vector<std::vector<int>>的元素类型为std::vector
+    def __init__(self):
+        self.enclosing = []
+
     def visit_abstract_type(self, at: generic.AbstractType):
         raise Exception('Nothing should be of this type')
 
@@ -44,9 +49,14 @@ class CHTypeConvertor(AbstractGenericTypesVisitor):
                                header_with_def=None, container_type=None, alias=rt.original_typedef)
 
     def visit_declared_class(self, dcc: generic.DeclaredClass):
+        full_name = generic.cat_ns(dcc.namespace, dcc.name)
+        if full_name in self.enclosing:
+            return self.visit_recursive_type(dcc)
         if dcc.template_args:
             fst_tmpl_arg = dcc.template_args[0]
+            self.enclosing.append(full_name)
             type_info = fst_tmpl_arg.accept_visitor(self)
+            self.enclosing.pop()
             type_info.set_container(utils.create_full_container(dcc.name, dcc.namespace))
         else:
             type_info = ch_basic.CHType(name=dcc.name, namespace=dcc.namespace,
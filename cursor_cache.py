@@ -0,0 +1,105 @@
+import logging
+
+# 缓存中表示没有值的标记，属性本身可能为None
+_MISSING = object()
+
+# 节点属性缓存，每个语法树一个，语法树释放时一起释放
+# 同一个AST节点每次从libclang得到的都是新的Cursor对象，Cursor自带的属性缓存不能共用，
+# 这里按Cursor结构体的内容缓存，同一个节点的属性每次解析最多通过ctypes读取一次
+class CursorCache(object):
+    def __init__(self):
+        self.values = {}
+        self.tables = {}
+        self.hits = {}
+        self.misses = {}
+
+    # 得到节点的属性，没有缓存时调用compute读取
+    # name:     str   属性名字
+    # compute:  函数  输入是clang.cindex.Cursor，返回属性值
+    def get(self, node, name, compute):
+        key = (name, node._kind_id, node.xdata, node.data[0], node.data[1], node.data[2])
+        value = self.values.get(key, _MISSING)
+        if value is _MISSING:
+            value = self.values[key] = compute(node)
+            self.misses[name] = self.misses.get(name, 0) + 1
+        else:
+            self.hits[name] = self.hits.get(name, 0) + 1
+        return value
+
+    # 得到语法树中其他结果的缓存表，如按类型缓存的结果，不存在时创建
+    # name:  str  缓存表的名字
+    def get_table(self, name):
+        return self.tables.setdefault(name, {})
+
+    # 清空缓存，语法树重新解析之后节点的内容可能已经改变
+    def clear(self):
+        self.values.clear()
+        for table in self.tables.values():
+            table.clear()
+
+# 得到语法树的节点属性缓存
+def get_cache(tu):
+    cache = getattr(tu, '_cursor_cache', None)
+    if cache is None:
+        cache = tu._cursor_cache = CursorCache()
+    return cache
+
+# 清空语法树的节点属性缓存
+def clear(tu):
+    get_cache(tu).clear()
+
+# 得到节点的属性，节点不属于任何语法树时直接读取
+def _get(node, name, compute):
+    tu = getattr(node, '_tu', None)
+    return get_cache(tu).get(node, name, compute) if tu is not None else compute(node)
+
+# 按节点缓存函数的结果，每个节点只计算一次
+# name: str  缓存中的属性名字，不能与其他属性重复
+def memoize(name):
+    def decorator(f):
+        def helper(node):
+            return _get(node, name, f)
+        return helper
+    return decorator
+
+# 节点名字
+def spelling(node):
+    return _get(node, 'spelling', lambda n: n.spelling)
+
+# 节点USR
+def usr(node):
+    return _get(node, 'usr', lambda n: n.get_usr())
+
+# 节点类型
+def get_type(node):
+    return _get(node, 'type', lambda n: n.type)
+
+# 节点位置，SourceLocation会缓存自己的文件、行和列
+def location(node):
+    return _get(node, 'location', lambda n: n.location)
+
+# 节点所在文件的路径，不在文件中时为None
+def file_name(node):
+    return _get(node, 'file_name', lambda n: location(n).file.name if location(n).file else None)
+
+# 节点的semantic parent
+def semantic_parent(node):
+    return _get(node, 'semantic_parent', lambda n: n.semantic_parent)
+
+# 节点的访问属性
+def access_specifier(node):
+    return _get(node, 'access_specifier', lambda n: n.access_specifier)
+
+# 得到语法树缓存的命中次数和读取次数，命中一次即少一次libclang调用
+# return: (Dict[str, int] 每个属性的命中次数, Dict[str, int] 每个属性的读取次数)
+def get_stats(tu):
+    cache = get_cache(tu)
+    return dict(cache.hits), dict(cache.misses)
+
+# 打印缓存统计
+def log_stats(tu):
+    hits, misses = get_stats(tu)
+    logging.info('Cursor cache saved %d of %d libclang calls (%s)', sum(hits.values()),
+                 sum(hits.values()) + sum(misses.values()),
+                 ', '.join('{} {}/{}'.format(name, hits.get(name, 0), hits.get(name, 0) + misses[name])
+                           for name in sorted(misses)))
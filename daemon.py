@@ -0,0 +1,95 @@
+import os
+import json
+import socket
+import logging
+import socketserver
+
+from collections import OrderedDict
+
+import discovery
+
+# 客户端只需要request，watch、printers和clang在常驻进程中才导入，保证客户端启动足够快
+
+# 常驻进程，保留语法树和提取出来的实体，重复请求时只增量解析改变了的头文件
+# 每个语法树使用自己的会话，实体缓存只属于一个语法树，其他语法树在头文件修改之前提取的实体不会被复用
+class CodegenDaemon(object):
+    # config:       Dict    与main.DEFAULT_CONFIG格式相同的配置
+    # max_parsers:  int     最多保留的语法树数量，超过时丢弃最久没有使用的
+    def __init__(self, config, max_parsers=8):
+        self.config = config
+        self.max_parsers = max_parsers
+        self.parsers = OrderedDict()
+
+    # 创建新的会话，选项与配置相同
+    def _create_session(self):
+        from session import Session
+        config = self.config
+        return Session(config['libclang_path'], transparent_types=config['transparent_types'],
+                       lazy_entities=config['lazy_entities'])
+
+    # 得到头文件列表对应的增量解析器，已经存在时只重新解析改变了的文件
+    def _get_parser(self, headers):
+        import watch
+        key = tuple(headers)
+        parser = self.parsers.pop(key, None)
+        if parser is None:
+            config = self.config
+            all_headers = discovery.find_headers(config['header_roots'], config['include_globs'],
+                                                 config['exclude_globs'])
+            header_paths = discovery.get_header_dirs(all_headers) + config['extra_header_paths']
+            parser = watch.IncrementalParser(list(headers), config['libclang_path'], config['stl_headers'],
+                                             config['c_headers'], config['target_macros'], header_paths,
+                                             pch_prelude=config['pch_prelude'], profile=config['profile'],
+                                             session=self._create_session(), sysroot=config['sysroot'])
+        else:
+            parser.refresh()
+
+        self.parsers[key] = parser
+        while len(self.parsers) > self.max_parsers:
+            self.parsers.popitem(last=False)
+        return parser
+
+    # 处理一个请求
+    # request: {"headers": [绝对路径, ...], "format": "json"}，headers为空时使用配置中发现的所有头文件
+    # return: {"output": 与main.py打印相同的文本}
+    def handle(self, request):
+        import printers
+        config = self.config
+        headers = request.get('headers') or discovery.find_headers(config['header_roots'], config['include_globs'],
+                                                                   config['exclude_globs'])
+        printer_class, _ = printers.PRINTERS[request.get('format') or config['format']]
+        parser = self._get_parser(headers)
+        return {'output': printers.format_entities(printer_class(), *parser.get_results())}
+
+# 每个连接读取一行JSON请求，返回一行JSON结果
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            response = self.server.codegen.handle(json.loads(self.rfile.readline()))
+        except (Exception, SystemExit) as e:
+            # 解析出现致命错误时parsers会调用exit，常驻进程不能因此退出
+            logging.exception('Failed to handle request')
+            response = {'error': str(e) or e.__class__.__name__}
+        self.wfile.write((json.dumps(response) + '\n').encode())
+
+# 在Unix socket上启动常驻进程，直到被中断
+def serve(socket_path, codegen_daemon):
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    server = socketserver.UnixStreamServer(socket_path, _RequestHandler)
+    server.codegen = codegen_daemon
+    logging.info('Codegen daemon listening on %s', socket_path)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.remove(socket_path)
+
+# 向常驻进程发送请求
+# return: Dict 常驻进程返回的结果，出错时包含error
+def request(socket_path, headers=None, output_format=None):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path)
+        client.sendall((json.dumps({'headers': headers, 'format': output_format}) + '\n').encode())
+        with client.makefile('rb') as response:
+            return json.loads(response.readline())
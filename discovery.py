@@ -0,0 +1,180 @@
+import os
+import re
+import json
+import fnmatch
+import hashlib
+import logging
+
+# 匹配 #include "xxx" 和 #include <xxx> 形式的头文件包含
+_INCLUDE_RE = re.compile(r'^[ \t]*#[ \t]*include[ \t]*(?:"([^"]+)"|<([^>]+)>)', re.MULTILINE)
+
+# manifest文件格式版本，格式变化时旧的manifest会被丢弃
+MANIFEST_VERSION = 3
+
+# 将glob列表编译成一个正则，同时匹配相对路径和文件名
+def _compile_globs(globs):
+    if not globs:
+        return None
+    return re.compile('|'.join('(?:{})'.format(fnmatch.translate(glob)) for glob in globs))
+
+# 判断路径是否满足编译后的glob
+def _matches(pattern, rel_path, name):
+    return pattern is not None and (pattern.match(rel_path) is not None or pattern.match(name) is not None)
+
+# 扫描目录，得到所有满足include且不满足exclude的头文件
+# roots:    List[str]    需要扫描的目录
+# include:  List[str]    需要包含的glob，如['*.h']
+# exclude:  List[str]    需要排除的glob，如['*/test/*']
+# return: List[str] 排好序的头文件绝对路径
+def find_headers(roots, include=('*.h', '*.hpp'), exclude=()):
+    include_pattern = _compile_globs(include)
+    exclude_pattern = _compile_globs(exclude)
+    headers = set()
+    for root in roots:
+        root = os.path.abspath(root)
+        for dir_path, _, file_names in os.walk(root):
+            rel_dir = dir_path[len(root) + 1:].replace('\\', '/')
+            for file_name in file_names:
+                rel_path = rel_dir + '/' + file_name if rel_dir else file_name
+                if _matches(include_pattern, rel_path, file_name) \
+                        and not _matches(exclude_pattern, rel_path, file_name):
+                    headers.add(os.path.join(dir_path, file_name))
+    return sorted(headers)
+
+# 得到头文件所在的所有目录，作为头文件搜索路径
+def get_header_dirs(headers):
+    return sorted({os.path.dirname(header) for header in headers})
+
+# 按文件名索引发现的头文件，在其他头文件目录中查找被包含的头文件时不需要逐个目录访问文件系统
+# return: (Dict[str, List[str]] 文件名 -> 头文件绝对路径, Set[str] 头文件所在的目录)
+def index_headers(headers):
+    by_name = {}
+    for header in headers:
+        by_name.setdefault(os.path.basename(header), []).append(header)
+    return by_name, set(get_header_dirs(headers))
+
+# 找到被包含的头文件，依次查找：头文件所在目录(只有"xxx"形式的包含)，发现的头文件，search_paths
+# 发现的头文件所在的目录都在编译参数中，相对于其中任何一个目录能找到即可
+# index:  Dict  index_headers得到的索引，为空则不查找发现的头文件
+def _resolve_include(name, header, search_paths, quoted=True, index=None):
+    if quoted:
+        path = os.path.normpath(os.path.join(os.path.dirname(header), name))
+        if os.path.isfile(path):
+            return path
+    name = os.path.normpath(name)
+    by_name, header_dirs = index or ({}, ())
+    for path in by_name.get(os.path.basename(name), ()):
+        if path.endswith(os.sep + name) and path[:-len(name) - 1] in header_dirs:
+            return path
+    for directory in search_paths:
+        path = os.path.abspath(os.path.join(directory, name))
+        if os.path.isfile(path):
+            return path
+    return None
+
+# 读取头文件，得到内容hash，它包含的本地头文件和找不到的头文件
+# 找不到的"xxx"包含可能之后才添加，也可能只在编译参数中的路径下才有；找不到的<xxx>包含一般是系统头文件，由调用者判断
+# return: (str, List[str] 本地头文件绝对路径, List[str] 找不到的"xxx"包含, List[str] 找不到的<xxx>包含)
+def _scan_header(header, search_paths, index=None):
+    with open(header, 'rb') as f:
+        content = f.read()
+    includes, unresolved, system = set(), set(), set()
+    for quoted_name, angled_name in _INCLUDE_RE.findall(content.decode('utf-8', errors='replace')):
+        path = _resolve_include(quoted_name or angled_name, header, search_paths, bool(quoted_name), index)
+        if path:
+            includes.add(path)
+        else:
+            (unresolved if quoted_name else system).add(quoted_name or angled_name)
+    return hashlib.sha256(content).hexdigest(), sorted(includes), sorted(unresolved), sorted(system)
+
+# 判断上次找不到的"xxx"包含现在是否能找到了，如新添加的头文件；<xxx>包含假定是系统头文件，不再查找
+def _has_new_includes(entry, header, search_paths, index):
+    return any(_resolve_include(name, header, search_paths, True, index) for name in entry.get('unresolved', ()))
+
+# 读取manifest，文件不存在或者格式不对时返回空manifest
+# return: (Dict[str, Dict] 头文件 -> 记录, str 保存时影响输出的设置的hash)
+def load_manifest(manifest_path):
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}, None
+    if manifest.get('version') != MANIFEST_VERSION:
+        return {}, None
+    return manifest.get('headers', {}), manifest.get('settings')
+
+# 保存manifest，解析成功后才应该保存
+# settings: str 影响输出的设置的hash，设置改变时所有头文件都需要重新生成
+def save_manifest(manifest_path, manifest, settings=None):
+    directory = os.path.dirname(os.path.abspath(manifest_path))
+    os.makedirs(directory, exist_ok=True)
+    with open(manifest_path + '.tmp', 'w') as f:
+        json.dump({'version': MANIFEST_VERSION, 'settings': settings, 'headers': manifest}, f, indent=1,
+                  sort_keys=True)
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+# 更新头文件的hash和修改时间，mtime和大小都没变时不读取文件
+# index:    Dict  index_headers得到的发现的头文件的索引
+# recheck:  bool  是否重新查找上次找不到的"xxx"包含，只在发现的头文件或者搜索路径改变时才需要
+# return: (新的manifest, 内容改变了的头文件)
+def update_manifest(headers, manifest, search_paths=(), index=None, recheck=False):
+    new_manifest = {}
+    changed = []
+    for header in headers:
+        stat = os.stat(header)
+        entry = manifest.get(header)
+        if entry and entry['mtime'] == stat.st_mtime_ns and entry['size'] == stat.st_size \
+                and not (recheck and _has_new_includes(entry, header, search_paths, index)):
+            new_manifest[header] = entry
+            continue
+
+        digest, includes, unresolved, system = _scan_header(header, search_paths, index)
+        # 保留其他模块记录在manifest中的信息，如生成的输出文件
+        new_manifest[header] = dict(entry or {}, hash=digest, mtime=stat.st_mtime_ns, size=stat.st_size,
+                                    includes=includes, unresolved=unresolved, system=system)
+        if not entry or entry['hash'] != digest or entry['includes'] != includes:
+            changed.append(header)
+    return new_manifest, changed
+
+# 得到包含了(直接或间接)改变的头文件的所有头文件
+def get_dependents(manifest, changed):
+    included_by = {}
+    for header, entry in manifest.items():
+        for include in entry['includes']:
+            included_by.setdefault(include, set()).add(header)
+
+    affected = set()
+    pending = list(changed)
+    while pending:
+        header = pending.pop()
+        if header not in affected:
+            affected.add(header)
+            pending.extend(included_by.get(header, ()))
+    return affected
+
+# 发现头文件并检测变化
+# roots:          List[str]    需要扫描的目录
+# include:        List[str]    需要包含的glob
+# exclude:        List[str]    需要排除的glob
+# manifest_path:  str          manifest文件路径，为空则认为所有头文件都改变了
+# search_paths:   List[str]    除头文件所在目录以外，解析 #include 时的搜索路径
+# settings:       str          影响输出的设置的hash，与manifest中的不同时所有头文件都需要解析
+# return: (所有头文件, 需要解析的头文件, 新的manifest, Dict 被删除的头文件 -> 它在旧manifest中的记录)
+def discover(roots, include=('*.h', '*.hpp'), exclude=(), manifest_path=None, search_paths=(), settings=None):
+    headers = find_headers(roots, include, exclude)
+    old_manifest, old_settings = load_manifest(manifest_path) if manifest_path else ({}, None)
+    # 与解析时一样，所有头文件所在的目录都在搜索路径中，通过索引查找
+    # 头文件和设置(包括额外的搜索路径)都没变时，上次找不到的包含现在也找不到，不需要重新查找
+    recheck = set(headers) != set(old_manifest) or old_settings != settings
+    manifest, changed = update_manifest(headers, old_manifest, search_paths, index_headers(headers), recheck)
+
+    # 被删除的头文件也会影响包含它的头文件
+    removed = {header: entry for header, entry in old_manifest.items() if header not in manifest}
+    affected = get_dependents({**old_manifest, **manifest}, changed + list(removed))
+    if old_settings != settings:
+        # 保留旧的记录，输出文件的记录用于删除不再生成的输出
+        logging.info('Settings changed since the manifest was saved')
+        affected = set(headers)
+    to_parse = [header for header in headers if header in affected]
+    logging.info('Discovered %d header(s), %d changed', len(headers), len(to_parse))
+    return headers, to_parse, manifest, removed
@@ -161,6 +161,37 @@ class TypeTraits(object):
         self.is_const = is_const
         self.ref_type = ref_type
 
+# 延迟求值的值，第一次求值时调用loader并保存结果，之后不再调用
+class Deferred(object):
+    # loader: 函数 没有参数，返回真正的值
+    def __init__(self, loader):
+        self.loader = loader
+        self.value = None
+        self.resolved = False
+
+    def resolve(self):
+        if not self.resolved:
+            self.value = self.loader()
+            self.resolved = True
+            self.loader = None
+        return self.value
+
+# 可以延迟求值的属性，实例中保存的值为Deferred时在第一次访问时求值并替换成结果
+class LazyAttribute(object):
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        value = instance.__dict__[self.name]
+        if isinstance(value, Deferred):
+            value = instance.__dict__[self.name] = value.resolve()
+        return value
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.name] = value
+
 # 类原型类
 class DeclaredClass(AbstractType):
     def __init__(self, name, namespace, template_args, header):
@@ -183,8 +214,12 @@ class DeclaredClass(AbstractType):
     def accept_visitor(self, visitor):
         return visitor.visit_declared_class(self)
 
-# 类类型
+# 类类型，members、methods和bases可以是Deferred，第一次访问时才从语法树中提取
 class DefinedClass(DeclaredClass):
+    members = LazyAttribute()
+    methods = LazyAttribute()
+    bases = LazyAttribute()
+
     def __init__(self, name, namespace, template_args, members, methods, bases, defined_in_header, location, annotation=None):
         super(DefinedClass, self).__init__(name, namespace, template_args, defined_in_header)
         self.members = members
@@ -197,6 +232,19 @@ class DefinedClass(DeclaredClass):
     def complete_name(self):
         return super(DefinedClass, self).complete_name()
 
+    # 浅拷贝共用同一个Deferred，不会触发求值，两者只求值一次
+    def __copy__(self):
+        entity = self.__class__.__new__(self.__class__)
+        entity.__dict__.update(self.__dict__)
+        return entity
+
+    # Deferred中引用了语法树节点，不能序列化，序列化之前先求值
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        for name in ('members', 'methods', 'bases'):
+            state[name] = getattr(self, name)
+        return state
+
     def accept_printer(self, printer):
         return printer.visit_abstract_defined_class(self)
 
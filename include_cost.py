@@ -0,0 +1,125 @@
+import os
+import json
+import time
+
+import parsers
+
+# 统计语法树中每个文件的节点数量，不属于任何文件的节点(如内置声明)记在空字符串下
+# return: Dict[str, int] 文件 -> 节点数量
+def count_nodes_by_file(tu):
+    counts = {}
+    stack = list(tu.cursor.get_children())
+    while stack:
+        node = stack.pop()
+        file = node.location.file
+        name = file.name if file else ''
+        counts[name] = counts.get(name, 0) + 1
+        stack.extend(node.get_children())
+
+    # 系统头文件的路径可能带有..，统一之后才能和包含树对应
+    normalized = {}
+    for name, count in counts.items():
+        name = os.path.normpath(name) if name else name
+        normalized[name] = normalized.get(name, 0) + count
+    return normalized
+
+# 从语法树中得到包含树，每个文件只记录第一次被包含的位置，有include guard的文件之后不会再被解析
+# return: Dict[str, List[str]] 文件 -> 它第一次包含的文件，all-src.cpp为根
+def get_include_tree(tu):
+    included = set()
+    tree = {}
+    for inclusion in tu.get_includes():
+        include = os.path.normpath(inclusion.include.name)
+        if include not in included:
+            included.add(include)
+            tree.setdefault(os.path.normpath(inclusion.source.name), []).append(include)
+    return tree
+
+# 计算包含树中每个文件子树的节点数量和文件数量
+# return: Dict[str, (int, int)] 文件 -> (子树节点数量, 子树文件数量)
+def _get_subtree_costs(tree, node_counts, root='all-src.cpp'):
+    costs = {}
+    stack = [(root, False)]
+    while stack:
+        path, visited = stack.pop()
+        children = tree.get(path, [])
+        if visited:
+            costs[path] = (node_counts.get(path, 0) + sum(costs[child][0] for child in children),
+                           1 + sum(costs[child][1] for child in children))
+        else:
+            stack.append((path, True))
+            stack.extend((child, False) for child in children)
+    return costs
+
+# 在包含树中得到从输入头文件到每个文件的包含链
+def _get_chains(tree, input_headers):
+    chains = {}
+    stack = [[header] for header in reversed(input_headers)]
+    while stack:
+        chain = stack.pop()
+        chains[chain[-1]] = chain
+        stack.extend(chain + [child] for child in tree.get(chain[-1], []))
+    return chains
+
+# 单独解析每个头文件，得到它(包括它包含的所有文件)的解析时间和节点数量
+# 其他参数与parsers.parse_tu相同，不使用语法树缓存
+# return: Dict[str, Dict] 头文件 -> {'parse_time': 秒, 'standalone_nodes': 节点数量}
+def measure_headers(input_headers, libclang_path, stl_headers, c_headers, target_macros, header_paths,
+                    pch_prelude=None, profile='full', sysroot='full'):
+    measurements = {}
+    for header in input_headers:
+        start = time.time()
+        tu, _ = parsers.parse_tu([header], libclang_path, stl_headers, c_headers, target_macros, header_paths,
+                                 pch_prelude=pch_prelude, profile=profile, sysroot=sysroot)
+        parse_time = time.time() - start
+        measurements[header] = {'parse_time': parse_time, 'standalone_nodes': sum(count_nodes_by_file(tu).values())}
+    return measurements
+
+# 将all-src.cpp语法树的解析开销归到输入头文件和包含链上
+# tu:             包含所有输入头文件的语法树
+# measurements:   measure_headers的结果，为空则不包含单独解析的时间
+# max_chains:     最多报告的包含链数量
+# return: Dict    {'headers': [每个头文件一行], 'chains': [最重的包含链]}
+def analyze(tu, input_headers, measurements=None, max_chains=20):
+    node_counts = count_nodes_by_file(tu)
+    tree = get_include_tree(tu)
+    costs = _get_subtree_costs(tree, node_counts)
+    chains = _get_chains(tree, input_headers)
+
+    headers = []
+    for header in input_headers:
+        # 头文件第一次包含的文件只在它这里解析，之后包含它们的头文件不再付出开销
+        exclusive_nodes, exclusive_files = costs.get(header, (0, 0))
+        row = {'header': header, 'own_nodes': node_counts.get(header, 0), 'exclusive_nodes': exclusive_nodes,
+               'exclusive_files': exclusive_files}
+        if measurements:
+            row.update(measurements[header])
+        headers.append(row)
+
+    input_header_set = set(input_headers)
+    chain_rows = [{'chain': chain, 'nodes': costs[path][0], 'files': costs[path][1]}
+                  for path, chain in chains.items() if path not in input_header_set]
+    chain_rows.sort(key=lambda row: row['nodes'], reverse=True)
+    return {'total_nodes': sum(node_counts.values()), 'headers': headers, 'chains': chain_rows[:max_chains]}
+
+# 将报告中的行格式化成表格，按sort_by列从大到小排序
+# columns: List[str] 需要显示的列，最后一列左对齐，其他列右对齐
+def format_table(rows, columns, sort_by=None):
+    def format_value(value):
+        if isinstance(value, float):
+            return '%.3f' % value
+        return ' -> '.join(value) if isinstance(value, list) else str(value)
+
+    if sort_by:
+        rows = sorted(rows, key=lambda row: row.get(sort_by, 0), reverse=True)
+    cells = [columns] + [[format_value(row.get(column, '')) for column in columns] for row in rows]
+    widths = [max(len(line[i]) for line in cells) for i in range(len(columns) - 1)]
+    return '\n'.join('  '.join([cell.rjust(width) for cell, width in zip(line, widths)] + [line[-1]])
+                     for line in cells)
+
+# 保存JSON格式的报告
+def save_report(report_path, report):
+    directory = os.path.dirname(os.path.abspath(report_path))
+    os.makedirs(directory, exist_ok=True)
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=1)
@@ -1,55 +1,385 @@
-import pathlib
+import os
+import sys
+import json
+import hashlib
+import argparse
 import logging
-import printers
+import discovery
 
-from parsers import parse
+# 启动时只导入轻量的模块，会加载libclang的parsers、watch、sharding、daemon以及printers
+# 在确认需要生成时才导入，所有输出都是最新的时候可以直接退出
 
-# 得到文件的完整路径，输入一个文件列表，返回一个绝对路径列表
-def _get_full_path(paths):
-    return [x if pathlib.PurePath(x).is_absolute() else str(pathlib.Path(x).resolve()) for x in paths]
+# 默认配置，可以被配置文件和命令行参数覆盖
+DEFAULT_CONFIG = {
+    # 需要扫描头文件的目录
+    'header_roots': [r"./src"],
+    # 需要解析的头文件glob
+    'include_globs': ['*.h', '*.hpp'],
+    # 不需要解析的头文件glob
+    'exclude_globs': [],
+    # 记录头文件hash和修改时间的manifest文件，为空则每次都解析所有头文件
+    'manifest_path': r"",
+    # clang动态链接库的路径
+    'libclang_path': r"",
+    # stl的头文件路径
+    'stl_headers': r"",
+    # C头文件路径
+    'c_headers': r"",
+    # 其他宏
+    'target_macros': [],
+    # 多个配置，配置名字 -> target_macros，不为空时一次生成所有配置，替代target_macros
+    'configs': {},
+    # 额外的头文件路径，发现的头文件所在目录会自动加入
+    'extra_header_paths': [],
+    # 需要预编译的公共头文件，为空则不使用预编译头
+    'pch_prelude': [],
+    # 语法树缓存目录，为空则每次都重新解析
+    'cache_dir': r"",
+    # 解析选项配置，parsers.PARSE_PROFILES中的一个
+    'profile': 'full',
+    # 系统头文件模式，utils.SYSROOTS中的一个，shim时使用内置的精简STL头文件
+    'sysroot': 'full',
+    # 是否先用词法扫描去掉没有定义class/struct/enum的头文件
+    'prescan': False,
+    # 并行解析的shard数量，大于1时每个shard单独生成语法树并行解析
+    'jobs': 1,
+    # 工程外仍然提取成员的类型的完整名字，如spark::handle，其他工程外的类型只提取名字
+    'transparent_types': [],
+    # 是否在第一次访问时才提取类的成员、方法和基类，提前分类成枚举或回调的实体不需要提取
+    'lazy_entities': False,
+    # 输出目录，为空则打印到标准输出
+    'output_dir': r"",
+    # 输出格式，printers.PRINTERS中的一个
+    'format': 'json',
+}
 
-# 配置logging
-logging.basicConfig(format = '%(levelname)s: %(module)s: %(lineno)s -- %(message)s', level = logging.WARNING)
+# 影响生成结果的配置，改变时manifest中记录的所有头文件都需要重新生成
+SETTINGS_KEYS = ['libclang_path', 'stl_headers', 'c_headers', 'target_macros', 'configs', 'extra_header_paths',
+                 'profile', 'sysroot', 'transparent_types', 'format']
 
-# 所有需要解释的头文件名称
-input_headers = ["./src/service/Service.h","./src/viewmodel/ITestViewModel.h", \
-                 "./src/viewmodel/TestViewModel/TestModel.h","./src/viewmodel/TestViewModel/TestViewModel.h"]
+# 解析命令行参数
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description='Generate bindings from C++ headers.')
+    parser.add_argument('--config', help='JSON config file, keys are the same as DEFAULT_CONFIG in main.py')
+    parser.add_argument('--jobs', '-j', type=int, help='number of shards parsed in parallel')
+    parser.add_argument('--cache-dir', help='directory for cached ASTs and precompiled headers')
+    parser.add_argument('--profile', help='clang parse option profile, one of parsers.PARSE_PROFILES')
+    parser.add_argument('--output-dir', help='write one file per entity here instead of printing to stdout')
+    parser.add_argument('--format', help='output format, one of printers.PRINTERS')
+    parser.add_argument('--sysroot', help='system headers to parse against, one of utils.SYSROOTS')
+    parser.add_argument('--check-shim', action='store_true',
+                        help='parse with both the full and the shim sysroot and report entities that differ')
+    parser.add_argument('--cost-report', metavar='JSON',
+                        help='attribute parse time and AST nodes to each header and write the report here')
+    parser.add_argument('--cost-sort', default='parse_time',
+                        help='column the cost table is sorted by, e.g. parse_time, exclusive_nodes')
+    parser.add_argument('--plan-shards', type=int, metavar='N',
+                        help='split the discovered headers into N shards balanced by cost and write --plan')
+    parser.add_argument('--run-shard', type=int, metavar='K', help='parse shard K of --plan into --shard-dir')
+    parser.add_argument('--merge-shards', action='store_true',
+                        help='merge the results in --shard-dir and generate output as a normal run')
+    parser.add_argument('--plan', help='shard plan file used by --plan-shards, --run-shard and --merge-shards')
+    parser.add_argument('--shard-dir', help='directory holding the results of --run-shard')
+    parser.add_argument('--cost-history', metavar='JSON',
+                        help='report written by --cost-report, used to balance shards')
+    parser.add_argument('--prescan', action='store_true', default=None,
+                        help='skip headers that define no class, struct or enum before running clang')
+    parser.add_argument('--watch', action='store_true', help='keep running and regenerate when headers change')
+    parser.add_argument('--serve', metavar='SOCKET', help='run as a daemon listening on this Unix socket')
+    parser.add_argument('--daemon', metavar='SOCKET', help='send the request to a daemon started with --serve')
+    parser.add_argument('headers', nargs='*', help='only regenerate these headers (with --daemon)')
+    return parser.parse_args(argv)
 
-# 得到所有头文件的绝对路径
-full_paths = _get_full_path(input_headers)
-print(str(pathlib.Path(input_headers[0]).resolve()))
+# 读取配置，命令行参数优先于配置文件
+def _load_config(args):
+    config = dict(DEFAULT_CONFIG)
+    if args.config:
+        with open(args.config) as f:
+            file_config = json.load(f)
+        unknown_keys = set(file_config) - set(DEFAULT_CONFIG)
+        if unknown_keys:
+            raise ValueError('Unknown config keys: ' + ', '.join(sorted(unknown_keys)))
+        config.update(file_config)
 
-# clang动态链接库的路径
-libclang_path = r""
+        # 配置文件中的相对路径相对于配置文件所在目录
+        config_dir = os.path.dirname(os.path.abspath(args.config))
+        for key in ['header_roots', 'extra_header_paths']:
+            config[key] = [os.path.join(config_dir, path) for path in config[key]]
+        for key in ['manifest_path', 'cache_dir', 'output_dir']:
+            config[key] = os.path.join(config_dir, config[key]) if config[key] else config[key]
 
-# stl的头文件路径
-stl_headers = r""
+    for key in ['jobs', 'cache_dir', 'profile', 'sysroot', 'prescan', 'output_dir', 'format']:
+        if getattr(args, key) is not None:
+            config[key] = getattr(args, key)
 
-# C头文件路径
-c_headers = r""
+    # 输出到目录并且有缓存目录时，默认在缓存目录中记录manifest，下次只重新生成改变了的头文件
+    if not config['manifest_path'] and config['cache_dir'] and config['output_dir']:
+        config['manifest_path'] = os.path.join(config['cache_dir'], 'manifest.json')
+    return config
 
-# 其他宏
-target_macros = []
+# 计算影响生成结果的配置的hash，记录在manifest中
+def _get_settings_hash(config):
+    settings = json.dumps({key: config[key] for key in SETTINGS_KEYS}, sort_keys=True)
+    return hashlib.sha256(settings.encode('utf-8')).hexdigest()
 
-# 头文件所在路径
-header_paths = [r"./src/service", r"./src/viewmodel", r"./src/viewmodel/TestViewModel"]
+# 判断头文件上次生成的输出文件是否都还存在
+def _outputs_exist(manifest_entry):
+    return 'outputs' in manifest_entry and all(os.path.exists(path) for path in manifest_entry['outputs'])
 
-# 将所有文件的实体解析出来
-models, enums, viewmodels, services = parse(full_paths, libclang_path, stl_headers, c_headers, target_macros, header_paths)
+# 记录每个头文件生成的输出文件，删除已经不再生成的旧文件
+def _update_outputs(manifest, headers, outputs):
+    for header in headers:
+        new_outputs = sorted(outputs.get(header, []))
+        for path in set(manifest[header].get('outputs', [])) - set(new_outputs):
+            if os.path.exists(path):
+                os.remove(path)
+        manifest[header]['outputs'] = new_outputs
 
-# 打印解析出来的个数
-print('Parsed'
-        + (' models: %d' % len(models) if len(models) else '')
-        + (' enums: %d' % len(enums) if len(enums) else '')
-        + (' viewmodels: %d' % len(viewmodels) if len(viewmodels) else '')
-        + (' services: %d' % len(services) if len(services) else ''))
+# 删除已经不存在的头文件生成的输出文件
+# removed: Dict[str, Dict] 被删除的头文件 -> 它在旧manifest中的记录
+def _remove_outputs(removed):
+    for entry in removed.values():
+        for path in entry.get('outputs', []):
+            if os.path.exists(path):
+                os.remove(path)
 
-# 打印model详细信息
-for model in models:
-    print(model.accept_printer(printers.JSONPrinter()))
-for viewmodel in viewmodels:
-    print(viewmodel.accept_printer(printers.JSONPrinter()))
-for enum in enums:
-    print(enum.accept_printer(printers.JSONPrinter()))
-for service in services:
-    print(service.accept_printer(printers.JSONPrinter()))
+# 分别使用真实的系统头文件和精简头文件解析，检查两者生成的实体是否相同
+# 两次解析各自使用新的会话，不共用实体缓存
+# return: int 进程返回值，有不同时为1
+def _check_shim(headers, parse_args, config, printer):
+    import parsers
+    import printers
+    import session
+    results = {}
+    for sysroot in ['full', 'shim']:
+        with session.Session(config['libclang_path'], **session.get_current().get_options()).activate():
+            results[sysroot] = parsers.parse(headers, *parse_args, cache_dir=config['cache_dir'] or None,
+                                             pch_prelude=config['pch_prelude'], profile=config['profile'],
+                                             prescan_headers=config['prescan'], sysroot=sysroot)
+    different = printers.diff_entities(printer, results['full'], results['shim'])
+    for name in different:
+        logging.error('Shim sysroot output differs for %s', name)
+    print('Shim sysroot output differs for %d entities' % len(different) if different
+          else 'Shim sysroot output is identical')
+    return 1 if different else 0
+
+# 一次生成所有配置，输出到输出目录中以配置名字命名的子目录，最后报告各配置之间不同的实体
+# return: Dict[str, List[str]] 头文件绝对路径 -> 它在所有配置中生成的输出文件
+def _run_configs(headers, manifest, header_paths, config, printer, extension):
+    import parsers
+    import printers
+    import multiconfig
+    results_by_config = multiconfig.parse_configs(
+        headers, config['configs'], config['libclang_path'], config['stl_headers'], config['c_headers'],
+        header_paths, manifest, header_paths, cache_dir=config['cache_dir'] or None,
+        pch_prelude=config['pch_prelude'], profile=config['profile'], prescan_headers=config['prescan'],
+        sysroot=config['sysroot'], jobs=config['jobs'])
+
+    outputs = {}
+    for name, results in results_by_config.items():
+        if config['output_dir']:
+            config_outputs = _write_entities(os.path.join(config['output_dir'], name), printer, extension,
+                                             parsers.get_scf_path(), *results)
+            for header, paths in config_outputs.items():
+                outputs.setdefault(header, []).extend(paths)
+        else:
+            print('Configuration %s:' % name)
+            print(printers.format_entities(printer, *results))
+
+    differences = multiconfig.diff_configs(printer, results_by_config)
+    if differences:
+        print('Entities that differ between configurations:')
+        for entity_name, groups in differences.items():
+            print('  %s: %s' % (entity_name, ' | '.join(', '.join(group) for group in groups)))
+    return outputs
+
+# 分析每个头文件的解析开销，打印表格并保存JSON报告
+def _report_cost(headers, parse_args, config, report_path, sort_by):
+    import time
+    import parsers
+    import include_cost
+    start = time.time()
+    tu, _ = parsers.parse_tu(headers, *parse_args, pch_prelude=config['pch_prelude'], profile=config['profile'],
+                             sysroot=config['sysroot'])
+    parse_time = time.time() - start
+    measurements = include_cost.measure_headers(headers, *parse_args, pch_prelude=config['pch_prelude'],
+                                                profile=config['profile'], sysroot=config['sysroot'])
+    report = dict(include_cost.analyze(tu, headers, measurements), parse_time=parse_time)
+    include_cost.save_report(report_path, report)
+
+    print('all-src.cpp: %.3fs, %d nodes' % (parse_time, report['total_nodes']))
+    print(include_cost.format_table(report['headers'], ['parse_time', 'standalone_nodes', 'exclusive_nodes',
+                                                        'exclusive_files', 'own_nodes', 'header'], sort_by))
+    print('Heaviest include chains:')
+    print(include_cost.format_table(report['chains'], ['nodes', 'files', 'chain']))
+    return 0
+
+# 将每个实体写到输出目录中单独的文件，如 models/ns.A.json
+# return: Dict[str, List[str]] 头文件绝对路径 -> 它生成的输出文件
+def _write_entities(output_dir, printer, extension, scf_path, models, enums, viewmodels, services):
+    outputs = {}
+    for kind, entities in [('models', models), ('enums', enums), ('viewmodels', viewmodels), ('services', services)]:
+        if not entities:
+            continue
+        os.makedirs(os.path.join(output_dir, kind), exist_ok=True)
+        for entity in entities:
+            path = os.path.join(output_dir, kind, entity.type_info.full_name.replace('::', '.') + extension)
+            with open(path, 'w') as f:
+                f.write(entity.accept_printer(printer))
+            if entity.definition_header:
+                outputs.setdefault(os.path.join(scf_path, entity.definition_header), []).append(os.path.abspath(path))
+    logging.info('Wrote %d entities to %s', len(models) + len(enums) + len(viewmodels) + len(services), output_dir)
+    return outputs
+
+def main(argv=None):
+    # 配置logging
+    logging.basicConfig(format = '%(levelname)s: %(module)s: %(lineno)s -- %(message)s', level = logging.WARNING)
+
+    args = _parse_args(argv)
+    config = _load_config(args)
+
+    # 交给常驻进程处理，省去启动、加载libclang和冷解析的时间
+    if args.daemon:
+        import daemon
+        response = daemon.request(args.daemon, [os.path.abspath(x) for x in args.headers], args.format)
+        if 'error' in response:
+            logging.error('Daemon error: %s', response['error'])
+            return 1
+        print(response['output'])
+        return 0
+
+    # 发现头文件，只解析新增、修改的头文件以及包含了它们的头文件
+    settings = _get_settings_hash(config)
+    all_headers, full_paths, manifest, removed = discovery.discover(
+        config['header_roots'], config['include_globs'], config['exclude_globs'], config['manifest_path'],
+        config['extra_header_paths'], settings)
+
+    # 在多台机器上分shard解析：生成计划，解析其中一个shard
+    if args.plan_shards or args.run_shard is not None:
+        import ci_shards
+        if args.plan_shards:
+            headers = all_headers
+            if config['prescan']:
+                import prescan
+                headers = prescan.filter_headers(headers)
+            costs = ci_shards.load_costs(args.cost_history) if args.cost_history else None
+            header_paths = discovery.get_header_dirs(all_headers) + config['extra_header_paths']
+            ci_shards.plan(args.plan, headers, header_paths, args.plan_shards, costs)
+        else:
+            ci_shards.run_shard(args.plan, args.run_shard, args.shard_dir, config['libclang_path'],
+                                config['stl_headers'], config['c_headers'], config['target_macros'],
+                                cache_dir=config['cache_dir'] or None, pch_prelude=config['pch_prelude'],
+                                profile=config['profile'], sysroot=config['sysroot'])
+        return 0
+
+    # 输出文件缺失的头文件也需要重新生成，被删除的头文件的输出在重新生成之前删除，实体移到其他头文件时会重新生成
+    if config['output_dir']:
+        _remove_outputs(removed)
+        changed_headers = set(full_paths)
+        full_paths = [header for header in all_headers
+                      if header in changed_headers or not _outputs_exist(manifest[header])]
+
+    # 所有输出都是最新的，不需要加载libclang
+    if not full_paths and not args.watch and not args.serve and not args.check_shim \
+            and not args.cost_report and not args.merge_shards:
+        # 只删除了头文件时也要保存manifest，下次不再处理被删除的头文件
+        if removed and config['manifest_path']:
+            discovery.save_manifest(config['manifest_path'], manifest, settings)
+        print('All headers are up to date')
+        return 0
+
+    import utils
+    import parsers
+    import printers
+    import session
+
+    if config['profile'] not in parsers.PARSE_PROFILES:
+        logging.error('Unknown profile %s, expected one of: %s', config['profile'],
+                      ', '.join(sorted(parsers.PARSE_PROFILES)))
+        return 2
+    if config['sysroot'] not in utils.SYSROOTS:
+        logging.error('Unknown sysroot %s, expected one of: %s', config['sysroot'], ', '.join(utils.SYSROOTS))
+        return 2
+    if config['format'] not in printers.PRINTERS:
+        logging.error('Unknown format %s, expected one of: %s', config['format'], ', '.join(sorted(printers.PRINTERS)))
+        return 2
+
+    # 命令行运行时所有解析共用默认会话
+    session.get_current().configure(transparent_types=config['transparent_types'],
+                                    lazy_entities=config['lazy_entities'])
+
+    # 作为常驻进程运行
+    if args.serve:
+        import daemon
+        try:
+            daemon.serve(args.serve, daemon.CodegenDaemon(config))
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    # 得到输出函数
+    printer_class, extension = printers.PRINTERS[config['format']]
+    if config['output_dir']:
+        def output(*results):
+            return _write_entities(config['output_dir'], printer_class(), extension, parsers.get_scf_path(), *results)
+    else:
+        def output(*results): print(printers.format_entities(printer_class(), *results))
+
+    # 头文件所在路径
+    header_paths = discovery.get_header_dirs(all_headers) + config['extra_header_paths']
+    parse_args = (config['libclang_path'], config['stl_headers'], config['c_headers'], config['target_macros'],
+                  header_paths)
+
+    # 检查精简头文件和真实系统头文件的结果是否相同，不生成输出
+    if args.check_shim:
+        return _check_shim(all_headers, parse_args, config, printer_class())
+
+    # 分析每个头文件的解析开销，不生成输出
+    if args.cost_report:
+        return _report_cost(all_headers, parse_args, config, args.cost_report, args.cost_sort)
+
+    # 使用--watch参数时保留语法树，头文件变化后增量重新生成
+    if args.watch:
+        import watch
+        watch_session = session.Session(config['libclang_path'], transparent_types=config['transparent_types'],
+                                        lazy_entities=config['lazy_entities'])
+        incremental_parser = watch.IncrementalParser(all_headers, *parse_args, pch_prelude=config['pch_prelude'],
+                                                     profile=config['profile'], session=watch_session,
+                                                     sysroot=config['sysroot'])
+        try:
+            watch.watch(incremental_parser, output)
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    if args.merge_shards:
+        import ci_shards
+        try:
+            results = ci_shards.merge_shards(args.plan, args.shard_dir)
+        except ValueError as e:
+            logging.error('%s', e)
+            return 1
+        outputs = output(*results)
+    elif config['configs']:
+        outputs = _run_configs(full_paths, manifest, header_paths, config, printer_class(), extension)
+    elif config['jobs'] > 1:
+        import sharding
+        outputs = output(*sharding.parse_sharded(full_paths, *parse_args, cache_dir=config['cache_dir'] or None,
+                                                 pch_prelude=config['pch_prelude'], profile=config['profile'],
+                                                 prescan_headers=config['prescan'], jobs=config['jobs'],
+                                                 sysroot=config['sysroot']))
+    else:
+        # 将所有文件的实体解析出来
+        outputs = output(*parsers.parse(full_paths, *parse_args, cache_dir=config['cache_dir'] or None,
+                                        pch_prelude=config['pch_prelude'], profile=config['profile'],
+                                        prescan_headers=config['prescan'], sysroot=config['sysroot']))
+
+    # 解析成功后才更新manifest
+    if config['manifest_path']:
+        if config['output_dir']:
+            _update_outputs(manifest, full_paths, outputs)
+        discovery.save_manifest(config['manifest_path'], manifest, settings)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
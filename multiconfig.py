@@ -0,0 +1,167 @@
+import os
+import re
+import logging
+import concurrent.futures
+
+import utils
+import parsers
+import prescan
+import sharding
+import discovery
+import session
+
+# 匹配宏定义参数，如 -DIOS=1、-DDEBUG、-UNDEBUG
+_MACRO_ARG_RE = re.compile(r'^-([DU])([A-Za-z_]\w*)(?:=(.*))?$')
+
+# 将target_macros分成宏定义和其他参数，-D和宏名字分开写时合并在一起
+# return: (Dict[str, str] 宏名字 -> 值，取消定义的宏值为None, List[str] 其他参数)
+def _parse_macro_args(target_macros):
+    macros = {}
+    other_args = []
+    i = 0
+    while i < len(target_macros):
+        arg = target_macros[i]
+        if arg in ('-D', '-U') and i + 1 < len(target_macros):
+            i += 1
+            arg += target_macros[i]
+        match = _MACRO_ARG_RE.match(arg)
+        if match:
+            kind, name, value = match.groups()
+            macros[name] = (value if value is not None else '1') if kind == 'D' else None
+        else:
+            other_args.append(arg)
+        i += 1
+    return macros, other_args
+
+# 得到在各个配置之间取值不同的宏
+# configs: Dict[str, List[str]] 配置名字 -> target_macros
+# return: (Set[str] 取值不同的宏, bool 除宏以外的参数是否不同)
+def get_differing_macros(configs):
+    parsed = [_parse_macro_args(target_macros) for target_macros in configs.values()]
+    names = {name for macros, _ in parsed for name in macros}
+    differing = {name for name in names if len({macros.get(name) for macros, _ in parsed}) > 1}
+    return differing, len({tuple(other_args) for _, other_args in parsed}) > 1
+
+# 得到头文件和它直接、间接包含的所有本地头文件
+def _get_closure(header, manifest, search_paths):
+    closure = set()
+    pending = [header]
+    while pending:
+        path = pending.pop()
+        if path in closure:
+            continue
+        closure.add(path)
+        if path not in manifest:
+            # 不在扫描目录中的头文件，如额外头文件路径中的头文件
+            manifest.update(discovery.update_manifest([path], {}, search_paths)[0])
+        pending.extend(manifest[path]['includes'])
+    return closure
+
+# 判断头文件中是否有在搜索路径和系统头文件路径中都找不到的包含
+# 这样的头文件可能来自编译参数中的路径，无法确定它是否用到了取值不同的宏
+# found: Dict[str, bool] 包含的名字 -> 是否在系统头文件路径中，多个头文件共用
+def _has_unresolved_includes(path, manifest, system_paths, found):
+    for name in manifest[path].get('unresolved', []) + manifest[path].get('system', []):
+        if name not in found:
+            found[name] = any(os.path.isfile(os.path.join(directory, name)) for directory in system_paths)
+        if not found[name]:
+            return True
+    return False
+
+# 判断文件中是否用到了给定的宏，只看去掉注释和字符串之后的标识符
+def _uses_macros(path, pattern, cache):
+    if path not in cache:
+        with open(path, errors='replace') as f:
+            cache[path] = pattern.search(prescan.strip_comments(f.read())) is not None
+    return cache[path]
+
+# 将头文件分成所有配置都相同的和依赖配置的两组
+# 头文件和它包含的本地头文件都没有用到取值不同的宏时，各个配置预处理之后的token完全相同，只需要解析一次
+# 系统头文件假定不受target_macros影响，找不到的头文件则认为依赖配置
+# system_paths: List[str] 系统头文件路径，只在这些路径中找到的头文件是系统头文件
+# return: (所有配置共用的头文件, 需要每个配置单独解析的头文件)
+def split_shared_headers(input_headers, configs, manifest, search_paths=(), system_paths=()):
+    differing, args_differ = get_differing_macros(configs)
+    if args_differ:
+        return [], list(input_headers)
+    if not differing:
+        return list(input_headers), []
+
+    pattern = re.compile(r'\b(?:{})\b'.format('|'.join(re.escape(name) for name in sorted(differing))))
+    manifest = dict(manifest)
+    cache = {}
+    found = {}
+    shared, dependent = [], []
+    for header in input_headers:
+        closure = _get_closure(header, manifest, search_paths)
+        if any(_has_unresolved_includes(path, manifest, system_paths, found) or _uses_macros(path, pattern, cache)
+               for path in closure):
+            dependent.append(header)
+        else:
+            shared.append(header)
+    return shared, dependent
+
+# 在工作进程中解析一组头文件，返回带USR的实体
+# session_options: Dict  创建会话的选项，与调用者的会话相同
+def _parse_group(headers, libclang_path, stl_headers, c_headers, target_macros, header_paths, cache_dir,
+                 pch_prelude, profile, sysroot, session_options):
+    # 实体缓存按USR保存，不区分配置，工作进程复用时每个任务使用单独的会话
+    with session.Session(libclang_path, **session_options).activate():
+        return sharding.parse_shard(headers, libclang_path, stl_headers, c_headers, target_macros, header_paths,
+                                    cache_dir, pch_prelude, profile, sysroot)
+
+# 一次解析多个配置，各个配置在不同的进程中并行解析，与配置无关的头文件只解析一次
+# configs:       Dict[str, List[str]]  配置名字 -> target_macros
+# manifest:      Dict                  discovery.discover得到的manifest，用于得到包含关系
+# search_paths:  List[str]             解析 #include 时的搜索路径
+# jobs:          int                   最多同时解析的数量，为空则使用CPU数量
+# 其他参数与parsers.parse相同
+# return: Dict[str, (models, enums, viewmodels, services)] 配置名字 -> 解析结果
+def parse_configs(input_headers, configs, libclang_path, stl_headers, c_headers, header_paths, manifest,
+                  search_paths=(), cache_dir=None, pch_prelude=None, profile='full', prescan_headers=False,
+                  sysroot='full', jobs=None):
+    if prescan_headers:
+        input_headers = prescan.filter_headers(input_headers)
+    if not input_headers:
+        return {name: ([], [], [], []) for name in configs}
+
+    # 与解析时一样，scf_path也在搜索路径中
+    system_paths = [utils.SHIM_PATH] if sysroot == 'shim' else [stl_headers, c_headers]
+    search_paths = list(search_paths) + [parsers.get_scf_path()]
+    shared, dependent = split_shared_headers(input_headers, configs, manifest, search_paths, system_paths)
+    logging.info('%d header(s) are shared by all configurations, %d depend on the configuration',
+                 len(shared), len(dependent))
+
+    options = (libclang_path, stl_headers, c_headers)
+    parse_options = (header_paths, cache_dir, pch_prelude, profile, sysroot, session.get_current().get_options())
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs or os.cpu_count() or 1) as pool:
+        # 共用的头文件使用第一个配置的宏解析，预处理的结果与其他配置相同
+        shared_future = pool.submit(_parse_group, shared, *options, next(iter(configs.values())),
+                                    *parse_options) if shared else None
+        futures = {name: pool.submit(_parse_group, dependent, *options, target_macros, *parse_options)
+                   for name, target_macros in configs.items() if dependent}
+        shared_results = shared_future.result() if shared_future else []
+
+        # 排成与单独解析每个配置时相同的顺序
+        results = {}
+        for name in configs:
+            merged = sharding.merge_shard_results([shared_results, futures[name].result() if dependent else []])
+            results[name] = parsers.convert_entities(parsers.order_entities(merged, input_headers))
+    return results
+
+# 比较各个配置的结果，实体按完整名字对应
+# results_by_config: Dict[str, (models, enums, viewmodels, services)]
+# return: Dict[str, List[List[str]]] 不同实体的完整名字 -> 按输出分组的配置名字，没有该实体的配置单独一组
+def diff_configs(printer, results_by_config):
+    outputs = {name: {entity.type_info.full_name: entity.accept_printer(printer)
+                      for entities in results for entity in entities}
+               for name, results in results_by_config.items()}
+    entity_names = {entity_name for entity_outputs in outputs.values() for entity_name in entity_outputs}
+    differences = {}
+    for entity_name in sorted(entity_names):
+        groups = {}
+        for name, entity_outputs in outputs.items():
+            groups.setdefault(entity_outputs.get(entity_name), []).append(name)
+        if len(groups) > 1:
+            differences[entity_name] = list(groups.values())
+    return differences
@@ -1,59 +1,93 @@
 import clang
 import pathlib
 import logging
-import itertools
 
 import tree_matchers
 import generic_composer
 import convertors
+import ast_cache
+import pch
+import prescan
+import cursor_cache
+import abstract_entity
+import generic
 
-from enum import Enum
 from utils import get_args
 from clang.cindex import TranslationUnit, Diagnostic
 
+# 解析选项配置，只需要声明时可以跳过函数体，减少解析时间
+PARSE_PROFILES = {
+    'full': TranslationUnit.PARSE_NONE,
+    'declarations-only': TranslationUnit.PARSE_SKIP_FUNCTION_BODIES | TranslationUnit.PARSE_INCOMPLETE,
+}
+
 # 判断函数是否是定义且在本地文件中
+# input_headers: Set[str] 头文件集合
 def _is_local_definition(input_headers):
     return lambda x: x.is_definition() and str(x.location.file) in input_headers
 
+# 判断节点是否不在本地文件中，不在的节点整个子树都不需要遍历
+def _is_external(input_headers):
+    return lambda x: str(x.location.file) not in input_headers
+
 # 过滤显式的注释
+# 头文件中有任何一个类带有explicit_annotation时，该头文件中只生成带有注释的类，枚举不能带注释，总是生成
+# 按头文件分组，不依赖实体的顺序，单个语法树、shard合并和多配置的结果使用同一个规则
 def _filter_by_explicit_annotation(entities, explicit_annotation):
-    filtered = []
-
-    class CodeGenMode(Enum):
-        EXPLICIT = 1
-        IMPLICIT = 2
-
     def has_annotation(entity, annotation):
         found_annotation = getattr(entity, 'annotation', None)
         return found_annotation == annotation if found_annotation else False
 
-    def filter_by_mode(items, mode):
-        if mode == CodeGenMode.IMPLICIT:
-            return items
-        elif mode == CodeGenMode.EXPLICIT:
-            return [item for item in items if has_annotation(item[0], explicit_annotation)]
+    explicit_headers = {entity.header for entity, _ in entities if has_annotation(entity, explicit_annotation)}
+    return [item for item in entities if item[0].header not in explicit_headers
+            or isinstance(item[0], generic.DefinedEnum) or has_annotation(item[0], explicit_annotation)]
 
-    for _, group in itertools.groupby(entities, key=lambda et: et[0].header):
-        mode_for_header = CodeGenMode.IMPLICIT
-        entities_in_header = list(group)
-        if any(has_annotation(item[0], explicit_annotation) for item in entities_in_header):
-            mode_for_header = CodeGenMode.EXPLICIT
-        filtered.extend(filter_by_mode(entities_in_header, mode_for_header))
-    return filtered
+# 将多个语法树的结果排成与所有头文件在一个语法树中解析时相同的顺序：先是所有类，再是所有枚举，
+# 类和枚举分别按头文件在input_headers中的顺序排列，同一个头文件中保持原来的顺序
+# entities_with_info: List[(实体, MetaClass)]
+# return: List[(实体, MetaClass)]
+def order_entities(entities_with_info, input_headers):
+    order = {header: i for i, header in enumerate(input_headers)}
+    return sorted(entities_with_info, key=lambda item: (isinstance(item[0], generic.DefinedEnum),
+                                                        order.get(item[0].location.filename, len(order))))
 
-# 将AST根节点解析成带有信息的实体
+# 从AST根节点中提取实体并分类
 # tu: all-src.cpp       clang.cindex.TranslationUnit    语法树根节点
 # input_headers:        List[str]                       头文件列表，用来验证实体是否属于这些头文件
 # scf_path:             str                             文件夹路径，用于提取header信息
-# entities_with_info：                                  带有信息的实体
-def parse_constructs(tu, input_headers, scf_path):
-    # 提取class节点和enum节点
-    class_nodes = tree_matchers.get_classes(tu.cursor, _is_local_definition(input_headers))
-    enum_nodes = tree_matchers.get_enums(tu.cursor, _is_local_definition(input_headers))
-
+# return: List[(实体, MetaClass)]
+def extract_entities(tu, input_headers, scf_path):
     # 从节点中提取实体信息并分类
-    entities_with_info = [generic_composer.get_entity_from_node(node,tu,scf_path) for node in class_nodes + enum_nodes]
-    
+    entities = [generic_composer.get_entity_from_node(node,tu,scf_path) for node in _get_entity_nodes(tu, input_headers)]
+    _log_cache_stats(tu)
+    return entities
+
+# 提取实体并带上节点的USR，用于合并多个语法树的结果时去重
+# return: List[(usr, 实体, MetaClass)]
+def extract_entities_with_usr(tu, input_headers, scf_path):
+    entities = [(cursor_cache.usr(node),) + generic_composer.get_entity_from_node(node, tu, scf_path)
+                for node in _get_entity_nodes(tu, input_headers)]
+    _log_cache_stats(tu)
+    return entities
+
+# 打印节点属性缓存和实体缓存的统计
+def _log_cache_stats(tu):
+    cursor_cache.log_stats(tu)
+    logging.info('Entity cache: %(hits)d hit(s), %(misses)d miss(es), %(evictions)d eviction(s), %(size)d entities',
+                 abstract_entity.get_entity_stats())
+
+# 提取头文件中定义的class节点和enum节点，只遍历一次语法树，跳过STL和系统头文件中的子树
+def _get_entity_nodes(tu, input_headers):
+    input_headers = set(input_headers)
+    class_nodes, enum_nodes = tree_matchers.match_all(
+        tu.cursor,
+        [tree_matchers.is_class(_is_local_definition(input_headers)),
+         tree_matchers.is_enum(_is_local_definition(input_headers))],
+        prune=_is_external(input_headers))
+    return class_nodes + enum_nodes
+
+# 将分类后的实体转换成models, enums, viewmodels, services
+def convert_entities(entities_with_info):
     # 根据header信息将文件分组并准备转换
     entities_to_generate = _filter_by_explicit_annotation(entities_with_info, 'explicit_codegen')
 
@@ -75,44 +109,100 @@ def parse_constructs(tu, input_headers, scf_path):
     
     return models, enums, viewmodels, services
 
-# 将所有头文件解析成信息实体返回
-# input_headers:  List[str]    所有需要解析的头文件相对路径
-# libclang_path:  str          libclang库的路径，已经设置可以用就置为空
-# stl_headers:    str          stl头文件所在路径，暂未用到
-# c_headers:      str          C头文件所在路径，暂未用到
-# target_macros:  List[str]    其他编译宏
-# header_paths:   List[str]    头文件路径
-# return: 带有信息的实体对象，枚举或类或函数或变量
-def parse(input_headers, libclang_path, stl_headers, c_headers, target_macros, header_paths):
+# 将AST根节点解析成带有信息的实体
+# tu: all-src.cpp       clang.cindex.TranslationUnit    语法树根节点
+# input_headers:        List[str]                       头文件列表，用来验证实体是否属于这些头文件
+# scf_path:             str                             文件夹路径，用于提取header信息
+# entities_with_info：                                  带有信息的实体
+def parse_constructs(tu, input_headers, scf_path):
+    return convert_entities(extract_entities(tu, input_headers, scf_path))
+
+# 得到整个工程的目录
+def get_scf_path():
+    return str(pathlib.Path(__file__).resolve().parent.parent)
+
+# 组装all_src.cpp文件，依次包含所有头文件
+def get_all_src(input_headers):
+    return '\n'.join(['#include "{}"'.format(x) for x in input_headers])
+
+# 将所有头文件解析成语法树
+# 参数与parse相同，index为空时clang会创建新的Index
+# return: (clang.cindex.TranslationUnit, scf_path)
+def parse_tu(input_headers, libclang_path, stl_headers, c_headers, target_macros, header_paths, cache_dir=None,
+             pch_prelude=None, profile='full', index=None, sysroot='full'):
     # 设置libclang库路径
     if libclang_path and not clang.cindex.Config.library_path:
         clang.cindex.Config.set_library_path(libclang_path)
     
     # 设置scf_path, 整个工程的目录
-    scf_path = str(pathlib.Path(__file__).resolve().parent.parent)
+    scf_path = get_scf_path()
 
-    # 组装all_src.cpp文件，依次包含所有头文件
-    all_src = '\n'.join(['#include "{}"'.format(x) for x in input_headers])
-
-    # 组装文件和文件的句柄
-    full_headers = [(x, open(x)) for x in input_headers]
-    
     # 得到clang的解析参数
-    args = get_args(stl_headers, c_headers, scf_path, target_macros, header_paths)
+    args = get_args(stl_headers, c_headers, scf_path, target_macros, header_paths, sysroot=sysroot)
 
-    # 使用clang解析，得到语法树根节点
-    tu = TranslationUnit.from_source('all-src.cpp', args, unsaved_files=[('all-src.cpp', all_src)] + full_headers)
+    # 使用预编译头时，把公共头文件预编译一次，之后通过参数复用
+    pch_path = None
+    if pch_prelude:
+        pch_path = pch.get_pch(pch_prelude, args, cache_dir, index)
+        args = get_args(stl_headers, c_headers, scf_path, target_macros, header_paths, pch_path, sysroot)
 
-    # 关闭所有文件
-    for _, f in full_headers:
-        f.close()
-    
-    # 如果解析文件错误，则停止程序，报告错误信息
-    for diag in tu.diagnostics:
-        if diag.severity == Diagnostic.Fatal:
-            logging.error("Parse Error (severity=%s, location=%s, type=%s)",
-                          diag.severity, diag.location, diag.spelling)
-            exit(diag.severity)
+    # 得到解析选项
+    options = PARSE_PROFILES[profile]
+
+    # 头文件和参数都没有变化时直接加载缓存的语法树
+    # 使用预编译头时不缓存语法树：依赖预编译头的AST文件加载时会让libclang崩溃，依赖的文件中也没有预编译头和它包含的头文件
+    cache_dir = cache_dir if not pch_path else None
+    cache_key = ast_cache.get_cache_key(input_headers, args, extra=[options]) if cache_dir else None
+    tu = ast_cache.load(cache_dir, cache_key, index) if cache_dir else None
+
+    if not tu:
+        # 组装文件和文件的句柄
+        full_headers = [(x, open(x)) for x in input_headers]
+
+        # 使用clang解析，得到语法树根节点
+        tu = TranslationUnit.from_source('all-src.cpp', args, index=index, options=options,
+                                         unsaved_files=[('all-src.cpp', get_all_src(input_headers))] + full_headers)
+
+        # 关闭所有文件
+        for _, f in full_headers:
+            f.close()
+
+        # 如果解析文件错误，则停止程序，报告错误信息
+        for diag in tu.diagnostics:
+            if diag.severity == Diagnostic.Fatal:
+                logging.error("Parse Error (severity=%s, location=%s, type=%s)",
+                              diag.severity, diag.location, diag.spelling)
+                exit(diag.severity)
+
+        if cache_dir:
+            ast_cache.store(cache_dir, cache_key, tu, input_headers)
+
+    return tu, scf_path
+
+# 将所有头文件解析成信息实体返回
+# input_headers:  List[str]    所有需要解析的头文件相对路径
+# libclang_path:  str          libclang库的路径，已经设置可以用就置为空
+# stl_headers:    str          stl头文件所在路径，暂未用到
+# c_headers:      str          C头文件所在路径，暂未用到
+# target_macros:  List[str]    其他编译宏
+# header_paths:   List[str]    头文件路径
+# cache_dir:      str          语法树和预编译头的缓存目录，为空则不使用语法树缓存，使用预编译头时只缓存预编译头
+# pch_prelude:    List[str]    需要预编译的公共头文件，为空则不使用预编译头
+# profile:        str          解析选项配置，PARSE_PROFILES中的一个
+# prescan_headers: bool        是否先用词法扫描去掉不可能生成实体的头文件
+# sysroot:        str          系统头文件模式，utils.SYSROOTS中的一个
+# index:          Index        复用的clang Index，为空时clang会创建新的Index
+# return: 带有信息的实体对象，枚举或类或函数或变量
+def parse(input_headers, libclang_path, stl_headers, c_headers, target_macros, header_paths, cache_dir=None,
+          pch_prelude=None, profile='full', prescan_headers=False, sysroot='full', index=None):
+    # 没有定义class/struct/enum的头文件不放入语法树
+    if prescan_headers:
+        input_headers = prescan.filter_headers(input_headers)
+        if not input_headers:
+            return [], [], [], []
+
+    tu, scf_path = parse_tu(input_headers, libclang_path, stl_headers, c_headers, target_macros, header_paths,
+                            cache_dir, pch_prelude, profile, index, sysroot)
 
     # 从语法树中提取信息
-    return parse_constructs(tu, input_headers, scf_path)
\ No newline at end of file
+    return parse_constructs(tu, input_headers, scf_path)
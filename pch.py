@@ -0,0 +1,47 @@
+import os
+import logging
+import tempfile
+
+import ast_cache
+
+from clang.cindex import TranslationUnit, Diagnostic
+
+# 预编译头的默认存放目录
+DEFAULT_PCH_DIR = os.path.join(tempfile.gettempdir(), 'codegen-pch')
+
+# 组装prelude文件，依次包含所有公共头文件
+def _get_prelude_source(prelude):
+    return '\n'.join(['#include <{}>'.format(x) for x in prelude])
+
+# 将源文件的编译参数转换成头文件的编译参数
+def _get_header_args(args):
+    header_args = list(args)
+    for i, arg in enumerate(header_args[:-1]):
+        if arg == '-x':
+            header_args[i + 1] = 'c++-header'
+    return header_args
+
+# 得到预编译头文件路径，prelude或者它包含的任何头文件变化时会自动重新生成
+# prelude:    List[str]    需要预编译的公共头文件，如['vector', 'memory']
+# args:       List[str]    utils.get_args得到的编译参数，不能包含预编译头参数
+# cache_dir:  str          预编译头存放目录，为空则使用系统临时目录
+# return: str 预编译头文件路径，生成失败返回None
+def get_pch(prelude, args, cache_dir=None, index=None):
+    cache_dir = cache_dir or DEFAULT_PCH_DIR
+    key = ast_cache.get_cache_key(prelude, args, extra=['pch'])
+    pch_path, _ = ast_cache.get_cache_paths(cache_dir, key, suffix='.pch')
+    if ast_cache.is_up_to_date(cache_dir, key, suffix='.pch'):
+        return pch_path
+
+    logging.info('Building precompiled header %s', pch_path)
+    tu = TranslationUnit.from_source('codegen-prelude.hpp', _get_header_args(args), index=index,
+                                     unsaved_files=[('codegen-prelude.hpp', _get_prelude_source(prelude))])
+
+    # 预编译头有致命错误时不使用，退回到普通解析
+    for diag in tu.diagnostics:
+        if diag.severity == Diagnostic.Fatal:
+            logging.warning("Failed to build precompiled header (location=%s, type=%s)",
+                            diag.location, diag.spelling)
+            return None
+
+    return pch_path if ast_cache.store(cache_dir, key, tu, [], suffix='.pch') else None
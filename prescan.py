@@ -0,0 +1,41 @@
+import re
+import logging
+
+# 匹配注释和字符串，扫描之前先去掉，避免注释里的class被当成定义
+_COMMENT_OR_STRING_RE = re.compile(r'//[^\n]*|/\*.*?\*/|"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'', re.DOTALL)
+
+# 匹配最多嵌套三层的括号，如 __attribute__((annotate(...)))，字符串已经在扫描之前去掉
+_PARENS = r'\((?:[^()]|\((?:[^()]|\([^()]*\))*\))*\)'
+
+# 匹配class、struct、enum的定义(不包括前置声明)，关键字和名字之间可以有任意标识符和宏调用，如
+# class A : public B {       struct [[deprecated]] C final {       enum class D : int {
+# class API_EXPORT E : public B {       struct __declspec(dllexport) F {       class G<int> {
+# 预扫描不能漏掉定义，宁可把函数定义之类的误认为类定义
+_DEFINITION_RE = re.compile(
+    r'\b(?:class|struct|enum(?:\s+class|\s+struct)?)\s+'
+    r'(?:(?:[A-Za-z_]\w*\b|::|\[\[.*?\]\]|' + _PARENS + r'|<(?:[^<>;{}]|<[^<>;{}]*>)*>)\s*)+'
+    r'(?::[^;{}]*)?\{', re.DOTALL)
+
+# 去掉注释和字符串
+def strip_comments(content):
+    return _COMMENT_OR_STRING_RE.sub(' ', content)
+
+# 扫描头文件，得到它定义的class/struct/enum个数和是否有显式生成的注释
+# return: (定义个数, 是否包含annotation)
+def scan_header(header, annotation='explicit_codegen'):
+    with open(header, errors='replace') as f:
+        content = f.read()
+    has_annotation = annotation in content
+    return len(_DEFINITION_RE.findall(strip_comments(content))), has_annotation
+
+# 判断头文件能不能生成model、viewmodel、service或者enum，只有定义了class/struct/enum的头文件才可能，
+# 带有显式生成注释的头文件也保留，注释可能加在通过宏定义的类上
+def may_define_entities(header):
+    definitions, has_annotation = scan_header(header)
+    return definitions > 0 or has_annotation
+
+# 去掉不可能生成实体的头文件，被其他头文件包含时它们仍然会被clang解析
+def filter_headers(input_headers):
+    headers = [header for header in input_headers if may_define_entities(header)]
+    logging.info('Pre-scan skipped %d of %d header(s)', len(input_headers) - len(headers), len(input_headers))
+    return headers
@@ -89,6 +89,10 @@ class AbstractPrinter:
 
 
 class JSONPrinter(AbstractPrinter):
+    def __init__(self):
+        # 正在打印的类，类型图中有环时再次遇到按递归类型打印
+        self.visiting = set()
+
     def visit_type(self, type_info):
         type_json = OrderedDict()
         type_json['type'] = str(type_info.full_name)
@@ -149,6 +153,15 @@ class JSONPrinter(AbstractPrinter):
         return json.dumps(model_json, indent=4, separators=(',', ': '))
 
     def visit_abstract_defined_class(self, adc):
+        if id(adc) in self.visiting:
+            return self.visit_recursive_type(adc)
+        self.visiting.add(id(adc))
+        try:
+            return self._get_defined_class_json(adc)
+        finally:
+            self.visiting.discard(id(adc))
+
+    def _get_defined_class_json(self, adc):
         type_json = OrderedDict()
         type_json['name'] = adc.name
 
@@ -295,4 +308,30 @@ class JSONPrinter(AbstractPrinter):
 
     def visit_recursive_type(self, rt):
         return {'meta': 'recursive',
-                'type': {'name': rt.name, 'namespace': rt.namespace}}
\ No newline at end of file
+                'type': {'name': rt.name, 'namespace': rt.namespace}}
+
+# 可选的输出格式，格式名 -> (printer类, 输出文件扩展名)
+PRINTERS = {
+    'json': (JSONPrinter, '.json'),
+}
+
+# 将解析出来的实体格式化成文本，第一行是解析出来的个数
+def format_entities(printer, models, enums, viewmodels, services):
+    lines = ['Parsed'
+             + (' models: %d' % len(models) if len(models) else '')
+             + (' enums: %d' % len(enums) if len(enums) else '')
+             + (' viewmodels: %d' % len(viewmodels) if len(viewmodels) else '')
+             + (' services: %d' % len(services) if len(services) else '')]
+    lines.extend(entity.accept_printer(printer) for entity in models + viewmodels + enums + services)
+    return '\n'.join(lines)
+
+# 比较两次解析的结果，实体按完整名字对应，输出不同或者只在一边出现的实体都算不同
+# results_a, results_b:  (models, enums, viewmodels, services)
+# return: List[str] 排好序的不同实体的完整名字
+def diff_entities(printer, results_a, results_b):
+    def get_outputs(results):
+        return {entity.type_info.full_name: entity.accept_printer(printer)
+                for entities in results for entity in entities}
+    outputs_a = get_outputs(results_a)
+    outputs_b = get_outputs(results_b)
+    return sorted(name for name in set(outputs_a) | set(outputs_b) if outputs_a.get(name) != outputs_b.get(name))
@@ -0,0 +1,141 @@
+import threading
+import contextlib
+import collections
+
+# 每个会话最多缓存的实体数量
+DEFAULT_MAX_ENTITIES = 100000
+
+# 有最大数量的缓存表，超过最大数量时淘汰最久没有使用的值，记录命中、未命中和淘汰的次数
+class LruCache(object):
+    # max_size: int  最多保存的值的数量，为None表示不限制
+    def __init__(self, max_size=None):
+        self.max_size = max_size
+        self.values = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # 得到key对应的值，不存在时返回default
+    def get(self, key, default=None):
+        with self.lock:
+            value = self.values.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self.values.move_to_end(key)
+            self.hits += 1
+            return value
+
+    # 保存值，超过最大数量时淘汰最久没有使用的值
+    def put(self, key, value):
+        with self.lock:
+            self.values[key] = value
+            self.values.move_to_end(key)
+            while self.max_size is not None and len(self.values) > self.max_size:
+                self.values.popitem(last=False)
+                self.evictions += 1
+
+    # 清空保存的值，统计不清空
+    def clear(self):
+        with self.lock:
+            self.values.clear()
+
+    def __len__(self):
+        return len(self.values)
+
+    # 得到统计信息
+    # return: Dict[str, int] hits、misses、evictions和size
+    def get_stats(self):
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'size': len(self.values)}
+
+# 缓存中表示没有值的标记，值本身可能为None
+_MISSING = object()
+
+# 每个线程当前激活的会话
+_local = threading.local()
+
+# 会话，保存clang Index和实体缓存，可以在多次解析之间复用，也可以在多个线程中同时使用
+# 提取实体时通过get_current得到当前线程激活的会话，没有激活的会话时使用默认会话
+class Session(object):
+    # libclang_path:  str    libclang库的路径，已经设置可以用就置为空
+    # max_entities:   int    实体缓存最多保存的实体数量，为None表示不限制
+    # transparent_types:  Iterable[str]  工程外仍然提取成员的类型的完整名字，如spark::handle，其他工程外的类型只提取名字
+    # lazy_entities:      bool           类的成员、方法和基类是否在第一次访问时才提取，提取之前实体会保留语法树
+    def __init__(self, libclang_path=None, max_entities=DEFAULT_MAX_ENTITIES, transparent_types=(),
+                 lazy_entities=False):
+        self.libclang_path = libclang_path
+        self.max_entities = max_entities
+        self.transparent_types = frozenset(transparent_types)
+        self.lazy_entities = lazy_entities
+        self.lock = threading.RLock()
+        self.caches = {}
+        self._index = None
+
+    # clang Index，第一次使用时创建，创建之前需要先设置libclang路径
+    @property
+    def index(self):
+        with self.lock:
+            if self._index is None:
+                import clang.cindex
+                if self.libclang_path and not clang.cindex.Config.library_path:
+                    clang.cindex.Config.set_library_path(self.libclang_path)
+                self._index = clang.cindex.Index.create()
+            return self._index
+
+    # 得到缓存表，不存在时创建
+    # key:      缓存的名字，如被缓存的函数
+    # factory:  函数  创建缓存表，缓存表需要支持clear
+    def get_cache(self, key, factory=dict):
+        cache = self.caches.get(key)
+        if cache is None:
+            with self.lock:
+                cache = self.caches.get(key)
+                if cache is None:
+                    cache = self.caches[key] = factory()
+        return cache
+
+    # 修改提取选项，参数与__init__相同，为None的选项不修改，已经提取的实体与新的选项不一致，同时清空缓存
+    def configure(self, transparent_types=None, lazy_entities=None):
+        if transparent_types is not None:
+            self.transparent_types = frozenset(transparent_types)
+        if lazy_entities is not None:
+            self.lazy_entities = lazy_entities
+        self.invalidate()
+
+    # 得到创建会话时的选项，用于在其他进程中创建相同设置的会话
+    # return: Dict  Session的关键字参数
+    def get_options(self):
+        return {'max_entities': self.max_entities, 'transparent_types': sorted(self.transparent_types),
+                'lazy_entities': self.lazy_entities}
+
+    # 清空所有缓存，语法树重新解析或者头文件改变之后旧的实体可能已经过期
+    def invalidate(self):
+        with self.lock:
+            for cache in self.caches.values():
+                cache.clear()
+
+    # 在当前线程中激活会话，退出时恢复之前激活的会话
+    @contextlib.contextmanager
+    def activate(self):
+        previous = getattr(_local, 'session', None)
+        _local.session = self
+        try:
+            yield self
+        finally:
+            _local.session = previous
+
+    # 使用会话的Index和缓存解析头文件，参数和返回值与parsers.parse相同
+    def parse(self, input_headers, stl_headers, c_headers, target_macros, header_paths, **kwargs):
+        import parsers
+        with self.activate():
+            return parsers.parse(input_headers, self.libclang_path, stl_headers, c_headers, target_macros,
+                                 header_paths, index=self.index, **kwargs)
+
+# 没有激活会话的线程共用的默认会话
+_default_session = Session()
+
+# 得到当前线程激活的会话
+def get_current():
+    return getattr(_local, 'session', None) or _default_session
@@ -0,0 +1,87 @@
+import os
+import functools
+import concurrent.futures
+
+import parsers
+import prescan
+import session
+
+# 可选的执行器类型
+EXECUTORS = {
+    # libclang通过ctypes调用，调用期间会释放GIL
+    'thread': concurrent.futures.ThreadPoolExecutor,
+    'process': concurrent.futures.ProcessPoolExecutor,
+}
+
+# 将头文件列表按顺序切分成数量尽量平均的shard，保持头文件原来的顺序
+def split_shards(input_headers, shard_count):
+    shard_count = max(1, min(shard_count, len(input_headers)))
+    size, remainder = divmod(len(input_headers), shard_count)
+    shards = []
+    start = 0
+    for i in range(shard_count):
+        end = start + size + (1 if i < remainder else 0)
+        shards.append(input_headers[start:end])
+        start = end
+    return shards
+
+# 解析一个shard，返回带USR的实体，实体中不含clang对象，可以在进程间传递
+def parse_shard(shard, libclang_path, stl_headers, c_headers, target_macros, header_paths, cache_dir=None,
+                pch_prelude=None, profile='full', sysroot='full'):
+    tu, scf_path = parsers.parse_tu(shard, libclang_path, stl_headers, c_headers, target_macros, header_paths,
+                                    cache_dir, pch_prelude, profile, sysroot=sysroot)
+    return parsers.extract_entities_with_usr(tu, shard, scf_path)
+
+# 在线程中使用调用者的会话解析shard，会话不能传递到其他进程
+def _parse_shard_in_session(current_session, *args):
+    with current_session.activate():
+        return parse_shard(*args)
+
+# 在工作进程中使用与调用者选项相同的新会话解析shard
+def _parse_shard_in_new_session(session_options, *args):
+    with session.Session(**session_options).activate():
+        return parse_shard(*args)
+
+# 合并多个shard的结果，公共头文件中重复的实体按USR去重，保留最先出现的
+# 结果按shard的顺序排列，需要与单个语法树的结果相同时再使用parsers.order_entities排序
+# return: List[(实体, MetaClass)]
+def merge_shard_results(shard_results):
+    seen_usrs = set()
+    merged = []
+    for results in shard_results:
+        for usr, entity, metaclass in results:
+            if usr not in seen_usrs:
+                seen_usrs.add(usr)
+                merged.append((entity, metaclass))
+    return merged
+
+# 将头文件分成多个shard，每个shard单独生成语法树并行解析，参数与parsers.parse相同
+# jobs:      int             shard数量，为空则使用CPU数量
+# executor:  str或Executor   'thread'，'process'，或者一个concurrent.futures.Executor实例
+# return: models, enums, viewmodels, services
+def parse_sharded(input_headers, libclang_path, stl_headers, c_headers, target_macros, header_paths,
+                  cache_dir=None, pch_prelude=None, profile='full', prescan_headers=False, jobs=None,
+                  executor='thread', sysroot='full'):
+    # 先去掉不可能生成实体的头文件，再切分shard
+    if prescan_headers:
+        input_headers = prescan.filter_headers(input_headers)
+        if not input_headers:
+            return [], [], [], []
+
+    shards = split_shards(input_headers, jobs or os.cpu_count() or 1)
+    options = (libclang_path, stl_headers, c_headers, target_macros, header_paths, cache_dir, pch_prelude, profile,
+               sysroot)
+
+    pool = executor if isinstance(executor, concurrent.futures.Executor) \
+        else EXECUTORS[executor](max_workers=len(shards))
+    current_session = session.get_current()
+    worker = functools.partial(_parse_shard_in_session, current_session) \
+        if isinstance(pool, concurrent.futures.ThreadPoolExecutor) \
+        else functools.partial(_parse_shard_in_new_session, current_session.get_options())
+    try:
+        shard_results = list(pool.map(worker, shards, *[[x] * len(shards) for x in options]))
+    finally:
+        if pool is not executor:
+            pool.shutdown()
+
+    return parsers.convert_entities(parsers.order_entities(merge_shard_results(shard_results), input_headers))
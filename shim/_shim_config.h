@@ -0,0 +1,19 @@
+// codegen shim sysroot: declares only the shapes that codegen recognises
+#pragma once
+#include <stddef.h>
+#include <stdint.h>
+namespace std {
+    using ::size_t;
+    using ::ptrdiff_t;
+    typedef decltype(nullptr) nullptr_t;
+
+    template <class T> class allocator {};
+    template <class T> struct char_traits {};
+    template <class T> struct less {};
+    template <class T> struct hash {};
+    template <class T> struct equal_to {};
+    template <class T1, class T2> struct pair {
+        T1 first;
+        T2 second;
+    };
+}
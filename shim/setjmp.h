@@ -0,0 +1 @@
+#pragma once
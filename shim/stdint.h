@@ -0,0 +1,18 @@
+#pragma once
+// 与glibc相同，先定义__intN_t再定义intN_t，生成的类型名字和真实系统头文件一致
+typedef signed char __int8_t;
+typedef short __int16_t;
+typedef int __int32_t;
+typedef long __int64_t;
+typedef unsigned char __uint8_t;
+typedef unsigned short __uint16_t;
+typedef unsigned int __uint32_t;
+typedef unsigned long __uint64_t;
+typedef __int8_t int8_t;
+typedef __int16_t int16_t;
+typedef __int32_t int32_t;
+typedef __int64_t int64_t;
+typedef __uint8_t uint8_t;
+typedef __uint16_t uint16_t;
+typedef __uint32_t uint32_t;
+typedef __uint64_t uint64_t;
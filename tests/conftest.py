@@ -0,0 +1,21 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# 测试直接导入仓库根目录下的模块
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# 放测试头文件的临时目录，头文件需要在scf_path之下，工程外的类不提取成员
+@pytest.fixture
+def project_dir():
+    with tempfile.TemporaryDirectory(dir=ROOT) as directory:
+        yield directory
+
+# 写入文件
+def write_file(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(content)
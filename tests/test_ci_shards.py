@@ -0,0 +1,74 @@
+import os
+import json
+
+import pytest
+
+import parsers
+import printers
+import session
+import ci_shards
+from conftest import write_file
+
+# 公共头文件被两个shard都包含，其中的实体合并时去重
+_HEADERS = {
+    'common.h': '''#include <string>
+enum Color { RED, GREEN };
+struct Shared { std::string name; Color color = RED; };
+''',
+    'model.h': '''#include "common.h"
+class Model { public: Shared shared; int count = 0; };
+''',
+    'service.h': '''#include "common.h"
+template <class T> class NotificationHelper {};
+class IService {};
+class CB { public: virtual void onShared(const Shared& shared) = 0; };
+class S : public IService, public NotificationHelper<CB> {
+public:
+    virtual void CreateInstance(const int& b);
+    virtual void f(Color color) = 0;
+};
+''',
+}
+
+# 生成计划并解析所有shard，返回头文件和计划文件的路径
+def _run_shards(project_dir):
+    headers = []
+    for name, content in _HEADERS.items():
+        headers.append(os.path.join(project_dir, name))
+        write_file(headers[-1], content)
+    plan_path = os.path.join(project_dir, 'plan.json')
+    shard_dir = os.path.join(project_dir, 'shards')
+    with session.Session().activate():
+        for shard_index in range(len(ci_shards.plan(plan_path, headers, [project_dir], 2))):
+            ci_shards.run_shard(plan_path, shard_index, shard_dir, '', '', '', [], sysroot='shim')
+    return headers, plan_path, shard_dir
+
+# 修改shard结果文件
+def _edit_shard(shard_dir, edit):
+    shard_path = ci_shards.get_shard_path(shard_dir, 0)
+    with open(shard_path) as f:
+        partial = json.load(f)
+    edit(partial)
+    with open(shard_path, 'w') as f:
+        json.dump(partial, f)
+
+# 合并JSON格式的shard结果与一次解析所有头文件的输出相同
+def test_merge_matches_single_parse(project_dir):
+    headers, plan_path, shard_dir = _run_shards(project_dir)
+    with session.Session().activate():
+        expected = parsers.parse(headers, '', '', '', [], [project_dir], sysroot='shim')
+        merged = ci_shards.merge_shards(plan_path, shard_dir)
+    assert printers.format_entities(printers.JSONPrinter(), *merged) == \
+           printers.format_entities(printers.JSONPrinter(), *expected)
+
+# 版本不同或者包含不允许的类的shard结果在读取实体之前被拒绝
+@pytest.mark.parametrize('edit', [
+    lambda partial: partial.update(version=ci_shards.PLAN_VERSION - 1),
+    lambda partial: partial['objects'][0].update({'class': 'Popen'}),
+    lambda partial: partial['results'][0].append({'enum': 'Popen', 'name': 'PIPE'}),
+])
+def test_merge_rejects_invalid_shard(project_dir, edit):
+    _, plan_path, shard_dir = _run_shards(project_dir)
+    _edit_shard(shard_dir, edit)
+    with pytest.raises(ValueError):
+        ci_shards.merge_shards(plan_path, shard_dir)
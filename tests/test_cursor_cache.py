@@ -0,0 +1,63 @@
+import os
+
+import parsers
+import cursor_cache
+from watch import IncrementalParser
+from conftest import write_file
+
+_HEADER = '''#include <string>
+namespace app {
+enum Color { RED, GREEN };
+class Model {
+public:
+    std::string name;
+    int count = 0;
+    void update(int value);
+};
+}
+'''
+
+# 得到语法树中头文件里的所有节点
+def _get_header_nodes(tu, header):
+    return [node for node in tu.cursor.walk_preorder() if node.location.file and node.location.file.name == header]
+
+# 检查每个节点缓存的属性与直接从libclang读取的相同
+def _check_cached_values(tu, header):
+    nodes = _get_header_nodes(tu, header)
+    assert nodes
+    for node in nodes:
+        location = cursor_cache.location(node)
+        assert cursor_cache.spelling(node) == node.spelling
+        assert cursor_cache.usr(node) == node.get_usr()
+        assert (location.file.name, location.line, location.column) == \
+               (node.location.file.name, node.location.line, node.location.column)
+        assert cursor_cache.file_name(node) == header
+    return nodes
+
+# 缓存的spelling、location、usr与直接访问节点得到的相同，再次访问时命中缓存
+def test_cached_values_match_cursor(project_dir):
+    header = os.path.join(project_dir, 'model.h')
+    write_file(header, _HEADER)
+    tu, _ = parsers.parse_tu([header], '', '', '', [], [project_dir], sysroot='shim')
+    nodes = _check_cached_values(tu, header)
+    hits, _ = cursor_cache.get_stats(tu)
+    _check_cached_values(tu, header)
+    hits_again, misses = cursor_cache.get_stats(tu)
+    for name in ['spelling', 'usr', 'location']:
+        assert hits_again[name] - hits.get(name, 0) == len(nodes)
+        assert misses[name] == len(nodes)
+
+# 语法树重新解析之后缓存被清空，属性与新的语法树一致
+def test_cache_cleared_after_reparse(project_dir):
+    header = os.path.join(project_dir, 'model.h')
+    write_file(header, _HEADER)
+    parser = IncrementalParser([header], '', '', '', [], [project_dir], sysroot='shim')
+    _check_cached_values(parser.tu, header)
+    cursor_cache.get_cache(parser.tu).get_table('test')['key'] = 'stale'
+
+    write_file(header, _HEADER.replace('int count = 0;', 'long total_count = 0;').replace('GREEN', 'BLUE'))
+    assert parser.refresh() == [header]
+    assert 'key' not in cursor_cache.get_cache(parser.tu).get_table('test')
+    spellings = [cursor_cache.spelling(node) for node in _check_cached_values(parser.tu, header)]
+    assert 'total_count' in spellings and 'BLUE' in spellings
+    assert 'count' not in spellings and 'GREEN' not in spellings
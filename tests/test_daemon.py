@@ -0,0 +1,54 @@
+import os
+import sys
+import json
+import time
+import subprocess
+
+import pytest
+
+import daemon
+from conftest import ROOT, write_file
+
+# service S通过NotificationHelper<CB>引用回调类CB，输出中包含CB的方法
+_CB = 'class CB {\npublic:\n    virtual void onA(int a) = 0;\n%s};\n'
+_S = '''#include "CB.h"
+template <class T> class NotificationHelper {};
+class IService {};
+class S : public IService, public NotificationHelper<CB> {
+public:
+    virtual void CreateInstance(const int& b);
+    virtual void f(int a) = 0;
+};
+'''
+
+# 启动常驻进程，等待socket创建之后返回socket路径
+@pytest.fixture
+def daemon_socket(project_dir):
+    write_file(os.path.join(project_dir, 'src', 'CB.h'), _CB % '')
+    write_file(os.path.join(project_dir, 'src', 'S.h'), _S)
+    config_path = os.path.join(project_dir, 'config.json')
+    with open(config_path, 'w') as f:
+        json.dump({'header_roots': ['src']}, f)
+    socket_path = os.path.join(project_dir, 'daemon.sock')
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, 'main.py'), '--config', config_path,
+                                '--serve', socket_path], cwd=ROOT)
+    try:
+        deadline = time.time() + 30
+        while not os.path.exists(socket_path):
+            assert process.poll() is None and time.time() < deadline
+            time.sleep(0.05)
+        yield socket_path
+    finally:
+        process.terminate()
+        process.wait()
+
+# 请求之间修改头文件，新的头文件组合得到修改后的实体，不使用其他语法树之前提取的实体
+def test_edit_between_requests(project_dir, daemon_socket):
+    service, callback = os.path.join(project_dir, 'src', 'S.h'), os.path.join(project_dir, 'src', 'CB.h')
+    first = daemon.request(daemon_socket, [service])['output']
+    assert '"onA"' in first and '"onB"' not in first
+
+    write_file(callback, _CB % '    virtual void onB(int b) = 0;\n')
+    assert '"onB"' in daemon.request(daemon_socket, [service, callback])['output']
+    # 之前的头文件组合增量解析
+    assert '"onB"' in daemon.request(daemon_socket, [service])['output']
@@ -0,0 +1,41 @@
+import os
+
+import discovery
+from conftest import write_file
+
+# 发现头文件并保存manifest，返回需要解析的头文件的相对路径
+def _discover(root, manifest_path):
+    _, to_parse, manifest, _ = discovery.discover([root], manifest_path=manifest_path)
+    discovery.save_manifest(manifest_path, manifest)
+    return [os.path.relpath(header, root) for header in to_parse]
+
+# 通过其他头文件目录包含的头文件修改后，包含它的头文件也需要重新解析
+def test_sibling_include_dependents(tmp_path):
+    root, manifest_path = str(tmp_path / 'src'), str(tmp_path / 'manifest.json')
+    write_file(os.path.join(root, 'a', 'X.h'), '#include <vector>\n#include "Y.h"\nclass X {};\n')
+    write_file(os.path.join(root, 'b', 'Y.h'), 'class Y {};\n')
+    assert _discover(root, manifest_path) == ['a/X.h', 'b/Y.h']
+
+    write_file(os.path.join(root, 'b', 'Y.h'), 'class Y { int y; };\n')
+    assert _discover(root, manifest_path) == ['a/X.h', 'b/Y.h']
+
+# 之前找不到的包含在新添加头文件之后能找到，包含它的头文件重新解析
+def test_new_header_resolves_include(tmp_path):
+    root, manifest_path = str(tmp_path / 'src'), str(tmp_path / 'manifest.json')
+    write_file(os.path.join(root, 'a', 'X.h'), '#include "W.h"\nclass X {};\n')
+    assert _discover(root, manifest_path) == ['a/X.h']
+
+    write_file(os.path.join(root, 'b', 'W.h'), 'class W {};\n')
+    assert _discover(root, manifest_path) == ['a/X.h', 'b/W.h']
+
+# 什么都没改变时不读取头文件，也不查找找不到的包含
+def test_noop_rerun_does_not_resolve(tmp_path, monkeypatch):
+    root, manifest_path = str(tmp_path / 'src'), str(tmp_path / 'manifest.json')
+    write_file(os.path.join(root, 'a', 'X.h'), '#include <vector>\n#include "Missing.h"\nclass X {};\n')
+    _discover(root, manifest_path)
+
+    def fail(*args):
+        raise AssertionError('unexpected include lookup')
+    monkeypatch.setattr(discovery, '_resolve_include', fail)
+    monkeypatch.setattr(discovery, '_scan_header', fail)
+    assert _discover(root, manifest_path) == []
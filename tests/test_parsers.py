@@ -0,0 +1,47 @@
+import os
+
+import parsers
+import tree_matchers
+from conftest import write_file
+
+_OUTER = '''#include <vector>
+#include <string>
+#include <map>
+#include "inner.h"
+namespace app {
+enum Mode { ON, OFF };
+class Outer {
+public:
+    class Nested { public: int n = 0; };
+    enum class Kind { A, B };
+    std::vector<Inner> items;
+};
+struct Forward;
+}
+struct Plain { int x = 1; };
+enum Loose { L1 };
+'''
+_INNER = '''#include <string>
+class Inner {
+public:
+    std::string name;
+    struct Deep { enum E { D }; };
+};
+'''
+
+# 修改之前的做法：分别先序遍历整个语法树找class和enum
+def _get_entity_nodes_by_separate_walks(tu, input_headers):
+    input_headers = set(input_headers)
+    return (tree_matchers.get_classes(tu.cursor, parsers._is_local_definition(input_headers))
+            + tree_matchers.get_enums(tu.cursor, parsers._is_local_definition(input_headers)))
+
+# 跳过工程外子树的一次遍历与分别遍历整个语法树得到相同的节点，顺序也相同
+def test_pruned_walk_matches_separate_walks(project_dir):
+    outer, inner = os.path.join(project_dir, 'outer.h'), os.path.join(project_dir, 'inner.h')
+    write_file(outer, _OUTER)
+    write_file(inner, _INNER)
+    for input_headers in [[outer, inner], [outer], [inner]]:
+        tu, _ = parsers.parse_tu(input_headers, '', '', '', [], [project_dir], sysroot='shim')
+        expected = _get_entity_nodes_by_separate_walks(tu, input_headers)
+        assert expected
+        assert parsers._get_entity_nodes(tu, input_headers) == expected
@@ -0,0 +1,28 @@
+import os
+import sys
+import json
+import glob
+import subprocess
+
+import pytest
+
+from conftest import ROOT, write_file
+
+# 预编译头需要真实的STL头文件
+_STL_HEADERS = sorted(glob.glob('/usr/include/c++/*'))
+_C_HEADERS = sorted(glob.glob('/usr/lib/gcc/*/*/include'))
+
+# 同时使用预编译头和语法树缓存时，第二次运行使用缓存的预编译头，结果与第一次相同
+@pytest.mark.skipif(not _STL_HEADERS or not _C_HEADERS, reason='needs libstdc++ headers')
+def test_pch_with_cache_dir(project_dir):
+    write_file(os.path.join(project_dir, 'src', 'M.h'),
+               '#include <vector>\n#include <string>\nclass M {\npublic:\n    int a = 1;\n    std::string s;\n};\n')
+    config_path = os.path.join(project_dir, 'config.json')
+    with open(config_path, 'w') as f:
+        json.dump({'header_roots': ['src'], 'stl_headers': _STL_HEADERS[-1], 'c_headers': _C_HEADERS[-1],
+                   'pch_prelude': ['vector', 'string'], 'cache_dir': 'cache'}, f)
+
+    outputs = [subprocess.run([sys.executable, os.path.join(ROOT, 'main.py'), '--config', config_path], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout for _ in range(2)]
+    assert 'Parsed models: 1' in outputs[0]
+    assert outputs[1] == outputs[0]
@@ -0,0 +1,44 @@
+import pytest
+
+import prescan
+
+# 写入头文件并扫描，返回定义个数
+def _count_definitions(tmp_path, content):
+    header = tmp_path / 'header.h'
+    header.write_text(content)
+    return prescan.scan_header(str(header))[0]
+
+@pytest.mark.parametrize('content', [
+    'class A : public B {};',
+    'struct [[deprecated]] C final {};',
+    'enum class D : int { X };',
+    'class __attribute__((annotate("explicit_codegen"))) M {};',
+    'class API_EXPORT Foo : public Bar {};',
+    'struct __declspec(dllexport) Foo {};',
+    'template <> class Foo<int> {};',
+    'class API_EXPORT(core) ns::Foo final : public Bar<std::map<int, int>> {};',
+    'struct alignas(16)\nVec\n{};',
+])
+def test_finds_definitions(tmp_path, content):
+    assert _count_definitions(tmp_path, content) == 1
+
+@pytest.mark.parametrize('content', [
+    'class Foo;',
+    'struct API_EXPORT Foo;',
+    'template <class T> using Ptr = T *;',
+    '// class Foo {};',
+    'const char *s = "struct Foo {";',
+])
+def test_skips_non_definitions(tmp_path, content):
+    assert _count_definitions(tmp_path, content) == 0
+
+# 只有前置声明的头文件被跳过，带有显式生成注释的头文件保留
+def test_filter_headers(tmp_path):
+    declarations = tmp_path / 'declarations.h'
+    declarations.write_text('class Foo;\nstruct Bar;\n')
+    exported = tmp_path / 'exported.h'
+    exported.write_text('class API_EXPORT Foo : public Bar {\n};\n')
+    annotated = tmp_path / 'annotated.h'
+    annotated.write_text('DECLARE_MODEL(Foo, explicit_codegen)\n')
+    headers = [str(declarations), str(exported), str(annotated)]
+    assert prescan.filter_headers(headers) == [str(exported), str(annotated)]
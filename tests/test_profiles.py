@@ -0,0 +1,24 @@
+import os
+
+import main
+import parsers
+import printers
+import session
+import discovery
+from conftest import ROOT
+
+# 在单独的会话中用给定的profile解析src/，实体缓存不在两个profile之间共用
+def _parse_src(profile):
+    headers = discovery.find_headers([os.path.join(ROOT, 'src')])
+    config = main.DEFAULT_CONFIG
+    with session.Session(config['libclang_path']).activate():
+        results = parsers.parse(headers, config['libclang_path'], config['stl_headers'], config['c_headers'],
+                                config['target_macros'], discovery.get_header_dirs(headers), profile=profile)
+    printer = printers.JSONPrinter()
+    return [[entity.accept_printer(printer) for entity in entities] for entities in results]
+
+# declarations-only跳过函数体，分类得到的model、enum、viewmodel、service应该与full完全相同
+def test_declarations_only_matches_full():
+    models, enums, viewmodels, services = _parse_src('full')
+    assert viewmodels and services
+    assert _parse_src('declarations-only') == [models, enums, viewmodels, services]
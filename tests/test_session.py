@@ -0,0 +1,25 @@
+import os
+
+import session
+import printers
+from conftest import write_file
+
+# 只有一个model的头文件
+_MODEL = 'class M {\npublic:\n    int a = 1;\n%s};\n'
+
+# 解析头文件，返回打印出的所有实体
+def _parse(current, headers):
+    return printers.format_entities(printers.JSONPrinter(),
+                                    *current.parse(headers, '', '', [], sorted({os.path.dirname(x) for x in headers})))
+
+# 同一个会话中头文件修改后再次解析，得到新的成员，不使用上一次语法树中的实体
+def test_parse_after_edit(project_dir):
+    header = os.path.join(project_dir, 'M.h')
+    write_file(header, _MODEL % '')
+    current = session.Session()
+    before = _parse(current, [header])
+    assert '"a"' in before and '"b"' not in before
+
+    write_file(header, _MODEL % '    int b = 2;\n')
+    after = _parse(current, [header])
+    assert '"a"' in after and '"b"' in after
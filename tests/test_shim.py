@@ -0,0 +1,42 @@
+import os
+import sys
+import glob
+import json
+import subprocess
+
+import pytest
+
+from conftest import ROOT, write_file
+
+_STL_HEADERS = sorted(glob.glob('/usr/include/c++/*'))
+_C_HEADERS = sorted(glob.glob('/usr/lib/gcc/*/*/include'))
+
+# 回调类中有一个方法只在真实的libstdc++中存在，精简头文件中没有定义_GLIBCXX_RELEASE
+_SERVICE = '''#include <vector>
+template <class T> class NotificationHelper {};
+class IService {};
+class CB {
+public:
+    virtual void onA(int a) = 0;
+#ifdef _GLIBCXX_RELEASE
+    virtual void onFull(int a) = 0;
+#endif
+};
+class S : public IService, public NotificationHelper<CB> {
+public:
+    virtual void CreateInstance(const int& b);
+    virtual void f(int a) = 0;
+};
+'''
+
+# 两种系统头文件得到的实体不同时--check-shim报告不同，回调类的不同也要比较出来
+@pytest.mark.skipif(not _STL_HEADERS or not _C_HEADERS, reason='needs libstdc++ headers')
+def test_check_shim_reports_difference(project_dir):
+    write_file(os.path.join(project_dir, 'src', 'S.h'), _SERVICE)
+    config_path = os.path.join(project_dir, 'config.json')
+    with open(config_path, 'w') as f:
+        json.dump({'header_roots': ['src'], 'stl_headers': _STL_HEADERS[-1], 'c_headers': _C_HEADERS[-1]}, f)
+    process = subprocess.run([sys.executable, os.path.join(ROOT, 'main.py'), '--config', config_path, '--check-shim'],
+                             cwd=ROOT, capture_output=True, text=True)
+    assert process.returncode == 1
+    assert process.stdout.strip() == 'Shim sysroot output differs for 1 entities'
@@ -0,0 +1,71 @@
+import os
+import sys
+import json
+import time
+import subprocess
+
+from conftest import ROOT, write_file
+
+# 所有输出都是最新时main的运行时间上限，秒
+STARTUP_BUDGET = 1.0
+
+# 在子进程中运行main，返回是否导入了clang
+_RUN_MAIN = '''
+import sys
+import main
+main.main(sys.argv[1:])
+print('clang' in sys.modules)
+'''
+
+# 在子进程中运行main
+# return: (str 标准输出, float 运行时间)
+def _run_main(*args):
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, '-c', _RUN_MAIN] + list(args), cwd=ROOT, capture_output=True,
+                             text=True, check=True)
+    return process.stdout, time.perf_counter() - start
+
+# 输出都是最新时不加载libclang，并且在时间预算内退出
+def test_up_to_date_run_skips_clang(tmp_path):
+    config_path = str(tmp_path / 'config.json')
+    with open(config_path, 'w') as f:
+        json.dump({'header_roots': [os.path.join(ROOT, 'src')], 'output_dir': str(tmp_path / 'out'),
+                   'manifest_path': str(tmp_path / 'manifest.json')}, f)
+
+    stdout, _ = _run_main('--config', config_path)
+    assert stdout.splitlines()[-1] == 'True'
+
+    stdout, elapsed = _run_main('--config', config_path)
+    assert stdout.splitlines() == ['All headers are up to date', 'False']
+    assert elapsed < STARTUP_BUDGET
+
+# 影响输出的设置改变时重新生成所有头文件
+def test_settings_change_regenerates(tmp_path):
+    config_path = str(tmp_path / 'config.json')
+    config = {'header_roots': [os.path.join(ROOT, 'src')], 'output_dir': str(tmp_path / 'out'),
+              'manifest_path': str(tmp_path / 'manifest.json')}
+    with open(config_path, 'w') as f:
+        json.dump(config, f)
+    _run_main('--config', config_path)
+
+    with open(config_path, 'w') as f:
+        json.dump(dict(config, target_macros=['-DIOS']), f)
+    stdout, _ = _run_main('--config', config_path)
+    assert stdout.splitlines() == ['True']
+
+# 删除头文件后删除它生成的输出，并且从manifest中去掉
+def test_deleted_header_outputs_removed(project_dir):
+    for name in ['A', 'B']:
+        write_file(os.path.join(project_dir, 'src', name + '.h'), 'class %s {\npublic:\n    int a = 1;\n};\n' % name)
+    config_path = os.path.join(project_dir, 'config.json')
+    with open(config_path, 'w') as f:
+        json.dump({'header_roots': ['src'], 'output_dir': 'out', 'manifest_path': 'manifest.json'}, f)
+    _run_main('--config', config_path)
+    assert sorted(os.listdir(os.path.join(project_dir, 'out', 'models'))) == ['A.json', 'B.json']
+
+    os.remove(os.path.join(project_dir, 'src', 'B.h'))
+    stdout, _ = _run_main('--config', config_path)
+    assert stdout.splitlines() == ['All headers are up to date', 'False']
+    assert os.listdir(os.path.join(project_dir, 'out', 'models')) == ['A.json']
+    with open(os.path.join(project_dir, 'manifest.json')) as f:
+        assert [os.path.basename(header) for header in json.load(f)['headers']] == ['A.h']
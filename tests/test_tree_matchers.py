@@ -0,0 +1,73 @@
+import os
+import tempfile
+
+import pytest
+from clang.cindex import CursorKind
+
+import parsers
+import tree_matchers as matchers
+from conftest import ROOT, write_file
+
+_HEADER = '''
+enum Color { RED, GREEN = 2 };
+struct Base { virtual ~Base(); };
+class Forward;
+class Model : public Base {
+public:
+    int a = 1;
+    bool b = false;
+    char c = 'c';
+    void *p = nullptr;
+    double d;
+    enum class Inner { X };
+    int get(int x, float y);
+    void set(int value);
+};
+template <class T> struct Box { T value; };
+'''
+
+_CLASS_KINDS = (CursorKind.CLASS_DECL, CursorKind.STRUCT_DECL)
+
+# 名字以M开头
+def _starts_with_m(node):
+    return node.spelling.startswith('M')
+
+# 编译后的matcher和它们替换的lambda，两者应该选出相同的节点
+_CASES = [
+    (matchers.is_class(), lambda n: n.kind in _CLASS_KINDS and n.is_definition()),
+    (matchers.is_enum(), lambda n: n.kind == CursorKind.ENUM_DECL and n.is_definition()),
+    (matchers.is_field(), lambda n: n.kind == CursorKind.FIELD_DECL),
+    (matchers.is_method(), lambda n: n.kind == CursorKind.CXX_METHOD),
+    (matchers.is_param(), lambda n: n.kind == CursorKind.PARM_DECL),
+    (matchers.is_base_class(), lambda n: n.kind == CursorKind.CXX_BASE_SPECIFIER),
+    (matchers.is_initializer(), lambda n: n.kind in (CursorKind.INTEGER_LITERAL, CursorKind.UNEXPOSED_EXPR)),
+    (matchers.is_kind([CursorKind.CLASS_DECL], _starts_with_m),
+     lambda n: n.kind == CursorKind.CLASS_DECL and _starts_with_m(n)),
+    (matchers.all_of(matchers.is_class(), _starts_with_m),
+     lambda n: n.kind in _CLASS_KINDS and n.is_definition() and _starts_with_m(n)),
+    (matchers.all_of(matchers.is_class(), matchers.is_kind([CursorKind.STRUCT_DECL])),
+     lambda n: n.kind == CursorKind.STRUCT_DECL and n.is_definition()),
+    (matchers.either_of(matchers.is_field(), matchers.is_method()),
+     lambda n: n.kind in (CursorKind.FIELD_DECL, CursorKind.CXX_METHOD)),
+    (matchers.either_of(matchers.is_enum(), _starts_with_m),
+     lambda n: (n.kind == CursorKind.ENUM_DECL and n.is_definition()) or _starts_with_m(n)),
+    (matchers.all_of(matchers.either_of(matchers.is_class(), matchers.is_enum()), _starts_with_m),
+     lambda n: n.kind in _CLASS_KINDS + (CursorKind.ENUM_DECL,) and n.is_definition() and _starts_with_m(n)),
+]
+
+# 解析测试头文件，所有用例共用一个语法树
+@pytest.fixture(scope='module')
+def tu():
+    with tempfile.TemporaryDirectory(dir=ROOT) as directory:
+        header = os.path.join(directory, 'matchers.h')
+        write_file(header, _HEADER)
+        yield parsers.parse_tu([header], '', '', '', [], [directory])[0]
+
+# 编译后的matcher在find_nodes、直接调用和match_all中都与lambda选出相同的节点，顺序相同
+@pytest.mark.parametrize('matcher, reference', _CASES)
+def test_compiled_matchers_match_lambdas(tu, matcher, reference):
+    expected = [node for node in tu.cursor.walk_preorder() if reference(node)]
+    assert expected
+    assert matchers.get_nodes(tu.cursor, matcher) == expected
+    assert [node for node in tu.cursor.walk_preorder() if matcher(node)] == expected
+    assert matchers.match_all(tu.cursor, [matcher])[0] == expected
@@ -1,58 +1,233 @@
-import clang
+import cursor_cache
+
+from clang.cindex import CursorKind
+
+# 按节点类型匹配的matcher，可以像函数一样调用，也可以编译成按CursorKind索引的表，
+# 编译之后每个节点只读取一次kind，只运行该类型对应的条件
+class KindMatcher(object):
+    # kinds:      Iterable[CursorKind]  可能匹配的节点类型，为None表示任何类型都可能匹配
+    # conditions: List[函数]            类型满足之后还需要满足的条件
+    def __init__(self, kinds, conditions=()):
+        self.kinds = frozenset(kinds) if kinds is not None else None
+        self.conditions = list(conditions)
+        self._compiled = None
+
+    # 编译后的表，第一次使用时创建，之后在每次查找中复用
+    def compiled(self):
+        if self._compiled is None:
+            self._compiled = CompiledMatchers([self])
+        return self._compiled
+
+    def __call__(self, node):
+        return self.compiled().matches(node)
+
+    # 得到节点类型为kind时需要判断的条件
+    # return: List[函数] 所有条件都满足才匹配，不可能匹配时返回None
+    def for_kind(self, kind):
+        if self.kinds is not None and kind not in self.kinds:
+            return None
+        predicates = []
+        for condition in self.conditions:
+            if isinstance(condition, KindMatcher):
+                sub_predicates = condition.for_kind(kind)
+                if sub_predicates is None:
+                    return None
+                predicates.extend(sub_predicates)
+            else:
+                predicates.append(condition)
+        return predicates
+
+# 满足任意一个条件的matcher，节点类型为其中所有条件可能匹配的类型的并集
+class _EitherOf(KindMatcher):
+    def __init__(self, conditions):
+        kinds = [getattr(condition, 'kinds', None) for condition in conditions]
+        KindMatcher.__init__(self, None if any(x is None for x in kinds) else set().union(*kinds))
+        self.alternatives = list(conditions)
+
+    def for_kind(self, kind):
+        branches = []
+        for condition in self.alternatives:
+            predicates = condition.for_kind(kind) if isinstance(condition, KindMatcher) else [condition]
+            if predicates is None:
+                continue
+            if not predicates:
+                return []
+            branches.append(predicates)
+        if not branches:
+            return None
+        if len(branches) == 1:
+            return branches[0]
+        return [lambda node: any(all(p(node) for p in predicates) for predicates in branches)]
+
+# 编译后的matcher表，按CursorKind保存每个matcher需要判断的条件，每种类型第一次出现时才编译
+# 表的key是节点的kind id，不需要每次都转换成CursorKind
+class CompiledMatchers(object):
+    # matchers: List[函数或KindMatcher]
+    def __init__(self, matchers):
+        self.matchers = list(matchers)
+        self.table = {}
+
+    # 得到节点类型为kind_id时需要判断的matcher
+    # return: List[(matcher序号, List[条件])]
+    def get_entries(self, kind_id):
+        entries = self.table.get(kind_id)
+        if entries is None:
+            kind = CursorKind.from_id(kind_id)
+            entries = []
+            for i, matcher in enumerate(self.matchers):
+                predicates = matcher.for_kind(kind) if isinstance(matcher, KindMatcher) else [matcher]
+                if predicates is not None:
+                    entries.append((i, predicates))
+            self.table[kind_id] = entries
+        return entries
+
+    # 得到节点满足的所有matcher的序号
+    def match(self, node):
+        return [i for i, predicates in self.get_entries(node._kind_id) if all(p(node) for p in predicates)]
+
+    # 判断节点是否满足任意一个matcher
+    def matches(self, node):
+        for _, predicates in self.get_entries(node._kind_id):
+            for predicate in predicates:
+                if not predicate(node):
+                    break
+            else:
+                return True
+        return False
+
+# 将matcher编译成按CursorKind索引的表
+def compile_matchers(matchers):
+    return CompiledMatchers(matchers)
 
 # 判断所有condtion是否都满足，都满足则为true，否则则为false
 def all_of(*conditions):
-    return lambda node: all(condition(node) for condition in conditions)
+    kinds = [condition.kinds for condition in conditions
+             if isinstance(condition, KindMatcher) and condition.kinds is not None]
+    return KindMatcher(frozenset.intersection(*kinds) if kinds else None, conditions)
 
 # 是其中的一个
 def either_of(*conditions):
-    return lambda node: any(condition(node) for condition in conditions)
+    return _EitherOf(conditions)
+
+# 判断节点是否为其中一种类型并满足conditions
+def is_kind(kinds, *conditions):
+    return KindMatcher(kinds, conditions)
+
+# 判断节点是否为定义
+def _is_definition(node):
+    return node.is_definition()
 
 # 判断是否为class，输入为clang.cindex.Cursor，输出为bool,返回一个函数，一个判断节点是否是满足conditions条件的class节点的函数
 def is_class(*conditions):
-    return lambda node: (node.kind == clang.cindex.CursorKind.CLASS_DECL \
-                        or node.kind == clang.cindex.CursorKind.STRUCT_DECL) \
-                        and node.is_definition() \
-                        and all_of(*conditions)(node)
+    return is_kind([CursorKind.CLASS_DECL, CursorKind.STRUCT_DECL], _is_definition, *conditions)
 
 # 判断节点是否为enum
 def is_enum(*conditions):
-    return lambda node: node.kind == clang.cindex.CursorKind.ENUM_DECL \
-                        and node.is_definition() \
-                        and all_of(*conditions)(node)
+    return is_kind([CursorKind.ENUM_DECL], _is_definition, *conditions)
 
 # 判断节点是否为method
 def is_method(*conditions):
-    return lambda node: node.kind == clang.cindex.CursorKind.CXX_METHOD \
-                        and all_of(*conditions)(node)
+    return is_kind([CursorKind.CXX_METHOD], *conditions)
 
 # 判断节点是否为field
 def is_field(*conditions):
-    return lambda node: node.kind == clang.cindex.CursorKind.FIELD_DECL \
-                        and all_of(*conditions)(node)
+    return is_kind([CursorKind.FIELD_DECL], *conditions)
+
+# 判断节点是否为参数
+def is_param():
+    return is_kind([CursorKind.PARM_DECL])
 
 # 判断节点是否为初始值
 def is_initializer():
-    return lambda node: node.kind == clang.cindex.CursorKind.INTEGER_LITERAL or node.kind == clang.cindex.CursorKind.UNEXPOSED_EXPR
+    return is_kind([CursorKind.INTEGER_LITERAL, CursorKind.UNEXPOSED_EXPR])
 
 # 判断类是否是基类，返回满足条件的基类
 def is_base_class(*conditions):
-    return lambda node: node.kind == clang.cindex.CursorKind.CXX_BASE_SPECIFIER \
-                        and all(condition(node) for condition in conditions)
+    return is_kind([CursorKind.CXX_BASE_SPECIFIER], *conditions)
+
+# 常用的matcher只创建一次，编译后的表可以在每次查找中复用
+_IS_PARAM = is_param()
+_IS_INITIALIZER_EXPR = is_kind([
+    CursorKind.INTEGER_LITERAL,
+    CursorKind.CXX_BOOL_LITERAL_EXPR,
+    CursorKind.UNEXPOSED_EXPR,
+    CursorKind.CHARACTER_LITERAL,
+    CursorKind.CXX_NULL_PTR_LITERAL_EXPR
+])
+
+# 惰性的匹配结果，可以直接迭代，也可以用first、single、any在得到答案后立即停止遍历
+class Matches(object):
+    # nodes: Iterable[clang.cindex.Cursor] 满足条件的节点，只在需要时才继续遍历
+    def __init__(self, nodes):
+        self.nodes = iter(nodes)
+
+    def __iter__(self):
+        return self.nodes
+
+    # 第一个满足条件的节点，没有则返回None
+    def first(self):
+        return next(self.nodes, None)
+
+    # 只有一个满足条件的节点时返回它，否则返回None，最多遍历到第二个满足条件的节点
+    def single(self):
+        node = next(self.nodes, None)
+        return node if node is not None and next(self.nodes, None) is None else None
+
+    # 是否存在满足条件的节点
+    def any(self):
+        return next(self.nodes, None) is not None
+
+# 惰性地在nodes中找到满足所有matcher的节点
+# nodes: Iterable[clang.cindex.Cursor] AST节点
+# matchers 函数列表指针 每个函数输入是clang.cindex.Cursor，返回值为bool的函数
+# return: Matches
+def find(nodes, *matchers):
+    compiled = _compile_all(matchers)
+    return Matches(node for node in nodes if compiled.matches(node))
+
+# 将需要同时满足的matcher编译成一个表，只有一个KindMatcher时复用它已经编译好的表
+def _compile_all(matchers):
+    matcher = matchers[0] if len(matchers) == 1 and isinstance(matchers[0], KindMatcher) else all_of(*matchers)
+    return matcher.compiled()
+
+# 惰性地先序遍历root的子树，找到满足所有matcher的节点
+def find_nodes(root, *matchers):
+    return find(root.walk_preorder(), *matchers)
+
+# 惰性地找到root的孩子中满足所有matcher的节点
+def find_children(root, *matchers):
+    return find(root.get_children(), *matchers)
 
 # 在nodes中找到满足条件的nodes返回
 # nodes: List[clang.cindex.Cursor] AST节点列表
 # matchers 函数列表指针 每个函数输入是clang.cindex.Cursor，返回值为bool的函数
 # List[clang.cindex.Cursor] nodes中，all matchers为true的节点
 def get(nodes, *matchers):
-    return [node for node in nodes if all(matcher(node) for matcher in matchers)]
+    return list(find(nodes, *matchers))
 
 # 得到root节点中所有字节中matcher返回值为true的节点
 # root clang.cindex.Cursor AST中的某一个节点
 # matchers 函数列表指针 每个函数输入是clang.cindex.Cursor，返回值为bool的函数
 # List[clang.cindex.Cursor] root的子节点中，all matchers为true的节点
 def get_nodes(root, *matchers):
-    return get(root.walk_preorder(), *matchers)
+    return list(find_nodes(root, *matchers))
+
+# 遍历一次root的子树，把每个节点同时交给所有matcher，分别收集满足每个matcher的节点
+# root:     clang.cindex.Cursor AST中的某一个节点
+# matchers: List[函数] 每个函数输入是clang.cindex.Cursor，返回值为bool
+# prune:    函数 输入是clang.cindex.Cursor，返回True时跳过该节点和它的整个子树，为空则遍历所有节点
+# return: List[List[clang.cindex.Cursor]] 每个matcher匹配的节点，顺序与walk_preorder相同
+def match_all(root, matchers, prune=None):
+    compiled = compile_matchers(matchers)
+    results = [[] for _ in matchers]
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        for i in compiled.match(node):
+            results[i].append(node)
+        children = [child for child in node.get_children() if prune is None or not prune(child)]
+        stack.extend(reversed(children))
+    return results
 
 # 得到root节点所有子节点中所有满足条件的节点
 # root clang.cindex.Cursor AST中的某一个节点
@@ -71,57 +246,37 @@ def get_enums(root, *conditions):
 
 # 得到root下所有参数节点
 def get_params(root):
-    return get_nodes(
-        root,
-        lambda n: n.kind == clang.cindex.CursorKind.PARM_DECL
-    )
+    return get_nodes(root, _IS_PARAM)
+
+# 惰性地得到root下所有参数节点
+def find_params(root):
+    return find_nodes(root, _IS_PARAM)
 
 # 得到root下所有初始值
 def get_initializer(root):
-    inits = get_nodes(root, is_initializer())
-    if len(inits) == 1:
-        return inits[0]
-    else:
-        return None
+    return find_nodes(root, is_initializer()).single()
 
-# 得到初始值节点
+# 得到初始值节点，找到第一个就停止遍历
 def get_initializer_expr(root):
-    init_vals = get_nodes(
-        root,
-        either_of(
-            lambda n: n.kind == clang.cindex.CursorKind.INTEGER_LITERAL,
-            lambda n: n.kind == clang.cindex.CursorKind.CXX_BOOL_LITERAL_EXPR,
-            lambda n: n.kind == clang.cindex.CursorKind.UNEXPOSED_EXPR,
-            lambda n: n.kind == clang.cindex.CursorKind.CHARACTER_LITERAL,
-            lambda n: n.kind == clang.cindex.CursorKind.CXX_NULL_PTR_LITERAL_EXPR
-        )
-    )
-    return init_vals[0] if init_vals else None
+    return find_nodes(root, _IS_INITIALIZER_EXPR).first()
 
 # 得到节点parent链中所有满足条件的节点
 def get_parents(root, *matchers):
-    parent = root.semantic_parent
+    compiled = _compile_all(matchers)
+    parent = cursor_cache.semantic_parent(root)
     matching_parents = []
     while parent:
-        if all(matcher(parent) for matcher in matchers):
+        if compiled.matches(parent):
             matching_parents.append(parent)
-        parent = parent.semantic_parent
+        parent = cursor_cache.semantic_parent(parent)
     return matching_parents[::-1]
 
-# 筛选节点列表中满足条件的节点
-def get(nodes, *matchers):
-    return [node for node in nodes if all(matcher(node) for matcher in matchers)]
-
 # 得到节点的孩子中所有满足条件的节点
 def get_children(root, *matchers):
     return get(root.get_children(), *matchers)
 
-# 满足条件就返回，不满足条件就返回空
+# 只有一个节点满足条件就返回，否则返回空，找到第二个就停止遍历
 def get_node(root, *matchers):
-    results = get_nodes(root, *matchers)
-    if len(results) == 1:
-        return results[0]
-    else:
-        return None
+    return find_nodes(root, *matchers).single()
 
     
\ No newline at end of file
@@ -1,30 +1,85 @@
+import os
+import collections
 import generic
+import session
 import tree_matchers
+import cursor_cache
 import ch_basic
 
 from clang.cindex import CursorKind, TypeKind
 
+# 查找节点时使用的matcher，只创建一次，编译后的表可以在每次查找中复用
+_IS_TYPE_ALIAS = tree_matchers.is_kind([CursorKind.TYPE_ALIAS_DECL])
+_IS_TYPEDEF_REF = tree_matchers.is_kind([CursorKind.TYPE_REF], lambda n: n.type.kind == TypeKind.TYPEDEF)
+
+# 内置的精简系统头文件目录，只声明生成代码时识别的STL模板和C类型
+SHIM_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'shim')
+
+# 可选的系统头文件模式
+# full: 使用stl_headers和c_headers中真实的系统头文件
+# shim: 使用SHIM_PATH中的精简头文件，不需要解析完整的libstdc++
+SYSROOTS = ('full', 'shim')
+
 # 返回基础编译选项
 def get_base_args():
     return ['-x', 'c++', '-std=c++17', '-ferror-limit=0', '-fdouble-square-bracket-attributes', '-DSPARK_CODEGEN=1']
 
-# 得到参数
-def get_args(stl_headers, c_headers, scf_path, target_macros, header_paths):
-    header_path_list = ['-I' + stl_headers, '-I' + c_headers, '-I' + scf_path]
+# 得到参数，pch_path不为空时使用预编译头，sysroot为shim时不搜索真实的系统头文件
+def get_args(stl_headers, c_headers, scf_path, target_macros, header_paths, pch_path=None, sysroot='full'):
+    if sysroot == 'shim':
+        header_path_list = ['-nostdinc', '-nostdinc++', '-I' + SHIM_PATH, '-I' + scf_path]
+    else:
+        header_path_list = ['-I' + stl_headers, '-I' + c_headers, '-I' + scf_path]
     for path in header_paths:
         header_path_list.append('-I' + path)
     args = get_base_args()
     args.extend(header_path_list)
     args.extend(target_macros)
+    if pch_path:
+        args.extend(['-include-pch', pch_path])
     return args
 
+# 得到声明上下文中的命名空间，按上下文的USR缓存在当前会话中，同一个上下文只向上查找一次
+# context: clang.cindex.Cursor 声明所在的上下文，为空表示不在任何上下文中
+# return: (Tuple[str] 去掉内部命名空间之后的命名空间, bool 是否在某个命名空间中)
+def _get_context_namespaces(context):
+    if context is None or context.kind == CursorKind.TRANSLATION_UNIT:
+        return (), False
+    usr = cursor_cache.usr(context)
+    table = session.get_current().get_cache(_get_context_namespaces)
+    namespaces = table.get(usr) if usr else None
+    if namespaces is None:
+        names, in_namespace = _get_context_namespaces(cursor_cache.semantic_parent(context))
+        if context.kind == CursorKind.NAMESPACE:
+            name = cursor_cache.spelling(context)
+            names, in_namespace = (names if '__' in name else names + (name,)), True
+        namespaces = names, in_namespace
+        # extern "C"等没有USR的上下文不缓存，它们的上层上下文仍然会被缓存
+        if usr:
+            table[usr] = namespaces
+    return namespaces
+
+# 得到enum所在上下文的完整名字，同一个上下文中的enum共用，只拆分一次类型名字
+def _get_enum_scope(node, node_type):
+    context = cursor_cache.semantic_parent(node)
+    usr = cursor_cache.usr(context) if context is not None else ''
+    table = session.get_current().get_cache(_get_enum_scope)
+    scope = table.get(usr, False) if usr else False
+    if scope is False:
+        spelling = node_type.spelling
+        scope = '::'.join(spelling.split('::')[:-1]) if '::' in spelling else None
+        if usr:
+            table[usr] = scope
+    return scope
+
 # 得到节点命名空间
 def get_namespace(node):
-    if node.type.kind == TypeKind.ENUM:
-        return '::'.join(node.type.spelling.split('::')[:-1]) if '::' in node.type.spelling else None
+    node_type = cursor_cache.get_type(node)
+    if node_type.kind == TypeKind.ENUM:
+        return _get_enum_scope(node, node_type)
     else:
-        parents = tree_matchers.get_parents(node, lambda n: n.kind == CursorKind.NAMESPACE)
-        return '::'.join([parent.spelling for parent in parents if '__' not in parent.spelling]) if parents else None
+        names, in_namespace = _get_context_namespaces(cursor_cache.semantic_parent(node))
+        return '::'.join(names) if in_namespace else None
 
 # 得到去掉公共前缀之后的字符
 def get_ch_subpath(header, scf_path):
@@ -34,8 +89,11 @@ def get_ch_subpath(header, scf_path):
 
 # 得到node的header信息
 def get_header(node, tu, scf_path):
-    header = node.location.file.name
+    header = cursor_cache.file_name(node)
     scf = scf_path
+    # 精简头文件和真实的系统头文件一样，不属于工程
+    if header.startswith(SHIM_PATH + os.sep):
+        return None
     if header.lower().startswith(scf.lower()):
         return get_ch_subpath(header, scf)
 
@@ -75,28 +133,30 @@ def _create_primitive_type(resolved_type, reference_type, is_const, container=No
         is_const = is_const, ref_type=reference_type
     )
 
-# 得到class的模板信息
+# 得到class的模板信息，每个声明只计算一次
+@cursor_cache.memoize('template_class')
 def get_template_class(node):
-    if node.type.get_num_template_arguments() > 0:
-        template_type = node.type.get_declaration()
+    node_type = cursor_cache.get_type(node)
+    if node_type.get_num_template_arguments() > 0:
+        template_type = node_type.get_declaration()
         if template_type.kind == CursorKind.TYPE_ALIAS_DECL:
             template_type = template_type.underlying_typedef_type.get_declaration()
         return template_type, get_namespace(template_type)
     elif node.kind == CursorKind.TYPE_ALIAS_TEMPLATE_DECL:
-        alias = tree_matchers.get_node(node, lambda n: n.kind == CursorKind.TYPE_ALIAS_DECL)
+        alias = tree_matchers.get_node(node, _IS_TYPE_ALIAS)
         get_template_class(alias)
     else:
         return None, None
 
 # 递归获取类型
 def _recursively_apply(node, predicate):
-    results = tree_matchers.get_children(node, predicate)
-    return _recursively_apply(results[0], predicate) if results else node
+    result = tree_matchers.find_children(node, predicate).first()
+    return _recursively_apply(result, predicate) if result else node
 
-# 获取类型的所有子类型
+# 获取类型的所有子类型，typedef链每个声明只遍历一次
+@cursor_cache.memoize('typedef_target')
 def _resolve_typedefs(node):
-    def predicate(n): return n.kind == CursorKind.TYPE_REF and n.type.kind == TypeKind.TYPEDEF
-    result = _recursively_apply(node, predicate)
+    result = _recursively_apply(node, _IS_TYPEDEF_REF)
     return result.type.get_declaration() if result != node else node
 
 # 创建一个container类型
@@ -127,14 +187,42 @@ def _get_pointed_type(starting_type):
 
     return new_node if new_node else starting_type, ref_type
 
-# 得到类的类型信息
+# get_type_info的结果，同一个语法树中按类型共用，不能修改
+# name、namespace、container_type: 按CHType规则处理之后的名字，如std::basic_string<char>为std::string
+# definition:  clang.cindex.Cursor  最终类型的声明，原始类型为None
+# container:   clang.cindex.Cursor  容器模板的声明，不是容器时为None
+ResolvedType = collections.namedtuple('ResolvedType', ['name', 'namespace', 'header_with_def', 'container_type',
+                                                       'is_enum', 'is_const', 'ref_type', 'definition', 'container'])
+
+# 由CHType创建ResolvedType
+def _make_resolved_type(type_info, definition, container):
+    return ResolvedType(type_info.name, type_info.namespace, type_info.header_with_def, type_info.container_type,
+                        type_info.is_enum, type_info.traits.is_const, type_info.traits.ref_type, definition, container)
+
+# 得到类的类型信息，结果缓存在语法树的节点属性缓存中
+# key为类型名字、规范类型名字(包含const和引用)和去掉指针引用之后的类型的声明的USR，
+# 名字相同的模板参数等类型在不同的声明中结果不同，需要用声明区分
+# return: ResolvedType
 def get_type_info(input_type, tu, scf_path):
+    if not tu:
+        return _get_type_info(input_type, tu, scf_path)
+    base_type, _ = _get_pointed_type(input_type)
+    key = (input_type.spelling, input_type.get_canonical().spelling, cursor_cache.usr(base_type.get_declaration()),
+           scf_path)
+    table = cursor_cache.get_cache(tu).get_table('type_info')
+    resolved = table.get(key)
+    if resolved is None:
+        resolved = table[key] = _get_type_info(input_type, tu, scf_path)
+    return resolved
+
+# 解析类的类型信息
+def _get_type_info(input_type, tu, scf_path):
     base_type, reference_type = _get_pointed_type(input_type)
     base_type_node = base_type.get_declaration()
     is_const = base_type.is_const_qualified()
 
     if is_primitive(base_type):
-        return _create_primitive_type(base_type, reference_type, is_const), None, None
+        return _make_resolved_type(_create_primitive_type(base_type, reference_type, is_const), None, None)
 
     container, container_namespace = get_template_class(base_type_node)
     aliased_node = _resolve_typedefs(base_type_node)
@@ -145,25 +233,25 @@ def get_type_info(input_type, tu, scf_path):
     )
 
     if is_primitive(final_type):
-        return _create_primitive_type(final_type, reference_type if reference_type else reference_type_new, is_const),\
-               None, None
+        return _make_resolved_type(_create_primitive_type(
+            final_type, reference_type if reference_type else reference_type_new, is_const), None, None)
 
     if container:
         template_arg_type = container.type.get_template_argument_type(0)
         if is_primitive(template_arg_type):
-            return _create_primitive_type(template_arg_type, reference_type if reference_type else reference_type_new,
-                                          is_const, create_full_container(container.spelling, container_namespace)),\
-                   None, container
+            return _make_resolved_type(_create_primitive_type(
+                template_arg_type, reference_type if reference_type else reference_type_new, is_const,
+                create_full_container(container.spelling, container_namespace)), None, container)
         ending_node = template_arg_type.get_declaration()
     else:
         ending_node = final_type.get_declaration()
 
-    return (ch_basic.CHType(
-        name=ending_node.spelling,
+    return _make_resolved_type(ch_basic.CHType(
+        name=cursor_cache.spelling(ending_node),
         namespace=get_namespace(ending_node),
         header_with_def=get_header(ending_node, tu, scf_path) if tu and scf_path else None,
         container_type=create_full_container(container.spelling if container else None, container_namespace),
         is_enum=ending_node.type.kind == TypeKind.ENUM,
         is_const=is_const,
         ref_type=reference_type if reference_type else reference_type_new
-    ), ending_node, container)
\ No newline at end of file
+    ), ending_node, container)
@@ -0,0 +1,121 @@
+import os
+import time
+import logging
+
+import parsers
+import cursor_cache
+import abstract_entity
+
+from session import Session
+
+# 得到文件的修改信息，文件不存在返回None
+def _get_stamp(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+# 读取文件内容作为unsaved file
+def _read_file(path):
+    with open(path) as f:
+        return f.read()
+
+# 从语法树中得到包含关系
+# return: Dict[str, Set[str]]  文件 -> 它直接包含的文件
+def get_include_graph(tu):
+    graph = {}
+    for inclusion in tu.get_includes():
+        graph.setdefault(inclusion.source.name, set()).add(inclusion.include.name)
+    return graph
+
+# 得到受影响的头文件：本身改变了，或者直接、间接包含了改变的文件
+def get_affected_headers(input_headers, include_graph, changed_files):
+    included_by = {}
+    for source, includes in include_graph.items():
+        for include in includes:
+            included_by.setdefault(include, set()).add(source)
+
+    affected = set()
+    pending = list(changed_files)
+    while pending:
+        path = pending.pop()
+        if path not in affected:
+            affected.add(path)
+            pending.extend(included_by.get(path, ()))
+    return [header for header in input_headers if header in affected]
+
+# 增量解析器，保留语法树，头文件变化时只重新解析和提取受影响的实体
+# session: session.Session  提供Index和实体缓存，为空时创建新的会话
+class IncrementalParser(object):
+    def __init__(self, input_headers, libclang_path, stl_headers, c_headers, target_macros, header_paths,
+                 pch_prelude=None, profile='full', session=None, sysroot='full'):
+        self.input_headers = input_headers
+        self.session = session or Session(libclang_path)
+        self.tu, self.scf_path = parsers.parse_tu(input_headers, libclang_path, stl_headers, c_headers,
+                                                  target_macros, header_paths, pch_prelude=pch_prelude,
+                                                  profile=profile, index=self.session.index, sysroot=sysroot)
+        self.include_graph = {}
+        self.stamps = {}
+        self._update_dependencies()
+        self.entities = self._extract(input_headers)
+
+    # 记录语法树依赖的所有文件和它们的修改信息
+    def _update_dependencies(self):
+        self.include_graph = get_include_graph(self.tu)
+        files = set(self.input_headers)
+        for includes in self.include_graph.values():
+            files.update(includes)
+        self.stamps = {path: _get_stamp(path) for path in files}
+
+    # 提取头文件中的实体，按头文件分组
+    def _extract(self, headers):
+        entities = {header: [] for header in headers}
+        with self.session.activate():
+            for entity, metaclass in parsers.extract_entities(self.tu, headers, self.scf_path):
+                entities[entity.location.filename].append((entity, metaclass))
+        return entities
+
+    # 得到上次解析之后改变了的文件
+    def get_changed_files(self):
+        return [path for path, stamp in self.stamps.items() if _get_stamp(path) != stamp]
+
+    # 检查文件变化并增量更新
+    # return: List[str] 重新提取的头文件，没有变化返回None
+    def refresh(self):
+        changed_files = self.get_changed_files()
+        if not changed_files:
+            return None
+
+        # all-src.cpp不在磁盘上，每次重新解析都要重新提供
+        unsaved_files = [('all-src.cpp', parsers.get_all_src(self.input_headers))]
+        unsaved_files.extend([(path, _read_file(path)) for path in changed_files if os.path.exists(path)])
+        # 延迟提取的实体引用了旧的语法树节点，重新解析之前先全部求值
+        abstract_entity.resolve_entities(entity for items in self.entities.values() for entity, _ in items)
+        self.tu.reparse(unsaved_files=unsaved_files)
+        cursor_cache.clear(self.tu)
+
+        # 语法树重新解析后旧的缓存实体已经失效
+        self.session.invalidate()
+        affected = get_affected_headers(self.input_headers, self.include_graph, changed_files)
+        self._update_dependencies()
+        self.entities.update(self._extract(affected))
+        return affected
+
+    # 得到所有头文件的models, enums, viewmodels, services
+    def get_results(self):
+        return parsers.convert_entities([item for header in self.input_headers for item in self.entities[header]])
+
+# 监视头文件变化，每次变化后通过on_update输出新的结果
+# parser:     IncrementalParser
+# on_update:  函数，参数为models, enums, viewmodels, services
+# interval:   float    检查文件变化的间隔，单位秒
+def watch(parser, on_update, interval=0.2):
+    on_update(*parser.get_results())
+    while True:
+        time.sleep(interval)
+        start = time.time()
+        affected = parser.refresh()
+        if affected is not None:
+            on_update(*parser.get_results())
+            logging.info('Regenerated %d header(s) in %.3fs', len(affected), time.time() - start)